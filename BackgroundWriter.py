@@ -0,0 +1,48 @@
+import queue
+import threading
+import traceback
+from typing import Callable
+
+
+class BackgroundWriter:
+    """
+    Runs logging tasks, like figure rendering and file writes, in a daemon thread.
+    The queue is bounded, when it is full new tasks are dropped instead of blocking the caller,
+    unless drop_on_full is False.
+    """
+
+    def __init__(self, max_queue_size: int = 4, drop_on_full: bool = True):
+        self.tasks = queue.Queue(maxsize=max_queue_size)
+        self.drop_on_full = drop_on_full
+        self.dropped = 0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, task: Callable, *args, **kwargs) -> bool:
+        try:
+            self.tasks.put((task, args, kwargs), block=not self.drop_on_full)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self):
+        """
+        Waits for queued tasks to finish and stops the thread.
+        """
+        self.tasks.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.tasks.get()
+            if item is None:
+                return
+
+            task, args, kwargs = item
+            try:
+                task(*args, **kwargs)
+            except Exception:
+                # A failed figure must not stop logging of the next ones
+                traceback.print_exc()
@@ -0,0 +1,89 @@
+import itertools
+import shutil
+import tempfile
+import time
+import tracemalloc
+import typing as t
+
+import numpy as np
+from vizdoom import Button
+
+import VizDoomActionSpace
+from VizDoomActionSpace import MUTUALLY_EXCLUSIVE_GROUPS, EXCLUSIVE_BUTTONS, build_action_table
+
+# Buttons are taken in this order, so every size mixes grouped, free and exclusive buttons
+BUTTONS = [
+    Button.ATTACK, Button.MOVE_FORWARD, Button.MOVE_BACKWARD, Button.TURN_RIGHT, Button.TURN_LEFT,
+    Button.SELECT_WEAPON1, Button.MOVE_RIGHT, Button.MOVE_LEFT, Button.SPEED, Button.SELECT_WEAPON2,
+    Button.USE, Button.JUMP, Button.SELECT_WEAPON3, Button.CROUCH, Button.STRAFE,
+    Button.SELECT_WEAPON4, Button.RELOAD, Button.ZOOM, Button.SELECT_WEAPON5, Button.ALTATTACK,
+    Button.SELECT_WEAPON6, Button.LOOK_UP, Button.LOOK_DOWN, Button.TURN180, Button.SELECT_WEAPON7,
+    Button.MOVE_UP, Button.MOVE_DOWN, Button.LAND,
+]
+
+button_counts = [5, 11, 15, 18, 20, 24, 28]
+# Legacy implementation needs a (2**n, groups, n) tensor, larger sizes do not fit in memory
+legacy_max_buttons = 20
+
+
+def legacy_get_available_actions(buttons: np.array) -> t.List[t.List[float]]:
+    """
+    Previous get_available_actions implementation, kept for comparison.
+    """
+    action_combinations = np.array([list(seq) for seq in itertools.product([0., 1.], repeat=len(buttons))])
+
+    exclusion_mask = np.isin(buttons, EXCLUSIVE_BUTTONS)
+    has_exclusive_button = ((np.any(action_combinations.astype(bool) & exclusion_mask, axis=-1))
+                            & (np.sum(action_combinations, axis=-1) > 1))
+
+    mutual_exclusion_mask = np.array([np.isin(buttons, excluded_group)
+                                      for excluded_group in MUTUALLY_EXCLUSIVE_GROUPS])
+    has_excluded_pair = np.any(np.sum(
+        (action_combinations[:, np.newaxis, :] * mutual_exclusion_mask.astype(int)),
+        axis=-1) > 1, axis=-1)
+
+    possible_actions = action_combinations[~(has_excluded_pair | has_exclusive_button)]
+    possible_actions = possible_actions[np.sum(possible_actions, axis=1) > 0]
+
+    return possible_actions.tolist()
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, elapsed * 1e3, peak / 2 ** 20
+
+
+def main():
+    cache_dir = tempfile.mkdtemp()
+    VizDoomActionSpace.ACTION_SPACE_CACHE_DIR = cache_dir
+
+    print('buttons  actions | legacy ms     MiB | generator ms     MiB | disk cache ms')
+    for button_count in button_counts:
+        buttons = BUTTONS[:button_count]
+
+        table, table_time, table_memory = measure(build_action_table, buttons)
+
+        VizDoomActionSpace._get_cached_action_table(tuple(buttons))
+        VizDoomActionSpace._get_cached_action_table.cache_clear()
+        _, cache_time, _ = measure(VizDoomActionSpace.get_available_actions, buttons)
+
+        legacy_str = '        -       -'
+        if button_count <= legacy_max_buttons:
+            legacy, legacy_time, legacy_memory = measure(legacy_get_available_actions, np.array(buttons))
+            assert np.array_equal(np.array(legacy).reshape(-1, button_count), table)
+            legacy_str = f'{legacy_time:9.1f} {legacy_memory:7.1f}'
+
+        print(f'{button_count:7} {len(table):8} | {legacy_str} | {table_time:12.2f} {table_memory:7.2f} | '
+              f'{cache_time:13.2f}')
+
+    shutil.rmtree(cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+
+from EventBuffer import EventBuffer
+from VizDoomEnv import VizDoomEnv
+from VizDoomVecEnv import make_vizdoom_vec_env
+from ROERewardShaping import ROERewardShaping, EVENTS_TYPES_NUMBER
+
+# TrainModel deathmatch config, for bots use VizDoomBotsEnv with 'bots_deathmatch' scenario
+scenario = 'deathmatch'
+env_class = VizDoomEnv
+n_envs = 16
+batch_size = 8
+total_steps = 20000
+
+env_kwargs = {
+    "scenario": scenario,
+    "is_window_visible": False,
+    "frame_skip": 4,
+    "doom_skill": 4,
+    "memory_size": 1,
+    "advanced_actions": False,
+
+    'reward_shaping_class': ROERewardShaping,
+    'reward_shaping_kwargs': {
+        'event_buffer_class': EventBuffer,
+        'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER},
+    },
+}
+
+
+def benchmark_sync():
+    env = make_vizdoom_vec_env(env_class, n_envs, env_kwargs)
+    env.reset()
+
+    steps = 0
+    start = time.perf_counter()
+    while steps < total_steps:
+        env.step(np.random.randint(0, env.action_space.n, n_envs))
+        steps += n_envs
+    steps_per_second = steps / (time.perf_counter() - start)
+
+    env.close()
+    return steps_per_second
+
+
+def benchmark_async():
+    env = make_vizdoom_vec_env(env_class, n_envs, env_kwargs, batch_size=batch_size)
+    env.async_reset()
+
+    steps = 0
+    start = time.perf_counter()
+    while steps < total_steps:
+        _, _, _, _, env_ids = env.recv()
+        env.send(np.random.randint(0, env.action_space.n, len(env_ids)), env_ids)
+        steps += len(env_ids)
+    steps_per_second = steps / (time.perf_counter() - start)
+
+    env.close()
+    return steps_per_second
+
+
+def main():
+    sync_steps_per_second = benchmark_sync()
+    async_steps_per_second = benchmark_async()
+
+    print(f'{env_class.__name__} {scenario}, {n_envs} envs')
+    print(f'sync:                  {sync_steps_per_second:.0f} steps/s')
+    print(f'async (batch size {batch_size}): {async_steps_per_second:.0f} steps/s '
+          f'({async_steps_per_second / sync_steps_per_second:.2f}x)')
+
+
+if __name__ == "__main__":
+    main()
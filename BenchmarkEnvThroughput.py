@@ -0,0 +1,186 @@
+import json
+import os
+import platform
+import time
+
+import numpy as np
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
+
+from EventBuffer import EventBuffer
+from VizDoomBotsEnv import VizDoomBotsEnv
+from VizDoomEnv import VizDoomEnv
+from VizDoomVecEnv import make_vizdoom_vec_env
+from ROERewardShaping import ROERewardShaping, SimpleRewardShaping, EVENTS_TYPES_NUMBER
+
+RESULTS_PATH = os.path.join(os.path.curdir, 'benchmarks', 'env_throughput.json')
+BASELINE_PATH = os.path.join(os.path.curdir, 'benchmarks', 'env_throughput_baseline.json')
+# Stores the results as the new baseline instead of comparing against it
+update_baseline = False
+# Relative throughput drop reported as regression
+regression_tolerance = 0.15
+
+warmup_steps = 100
+benchmark_steps = 2000
+benchmark_resets = 20
+
+ENV_CLASSES = {
+    'VizDoomEnv': VizDoomEnv,
+    'VizDoomBotsEnv': VizDoomBotsEnv,
+}
+
+REWARD_SHAPING_CLASSES = {
+    'none': None,
+    'SimpleRewardShaping': SimpleRewardShaping,
+    'ROERewardShaping': ROERewardShaping,
+}
+
+BASE_CONFIG = {
+    'env_class': 'VizDoomEnv',
+    'scenario': 'health_gathering',
+    'frame_skip': 4,
+    'resolution': (160, 120),
+    'memory_size': 1,
+    'reward_shaping': 'SimpleRewardShaping',
+    'vec_env': 'dummy',
+    'n_envs': 1,
+}
+
+# Every variation changes the base config along one axis
+VARIATIONS = [
+    {},
+    {'scenario': 'basic'},
+    {'scenario': 'deathmatch'},
+    {'env_class': 'VizDoomBotsEnv', 'scenario': 'bots_deathmatch'},
+    {'frame_skip': 1},
+    {'frame_skip': 10},
+    {'resolution': (320, 240)},
+    {'memory_size': 4},
+    {'reward_shaping': 'none'},
+    {'reward_shaping': 'ROERewardShaping'},
+    {'vec_env': 'dummy', 'n_envs': 4},
+    {'vec_env': 'subproc', 'n_envs': 4},
+    {'vec_env': 'vizdoom', 'n_envs': 4},
+    {'vec_env': 'vizdoom', 'n_envs': 16},
+]
+
+
+def get_config_name(config: dict) -> str:
+    return ' '.join(f'{key}={"x".join(map(str, value)) if isinstance(value, tuple) else value}'
+                    for key, value in config.items())
+
+
+def get_short_name(name: str) -> str:
+    # Only the settings that differ from the base config
+    base = get_config_name(BASE_CONFIG).split()
+    return ' '.join(setting for setting in name.split() if setting not in base) or 'base'
+
+
+def make_env(config: dict):
+    reward_shaping_class = REWARD_SHAPING_CLASSES[config['reward_shaping']]
+    env_kwargs = {
+        "scenario": config['scenario'],
+        "is_window_visible": False,
+        "frame_skip": config['frame_skip'],
+        "resolution": config['resolution'],
+        "memory_size": config['memory_size'],
+        "advanced_actions": False,
+
+        'reward_shaping_class': reward_shaping_class,
+        'reward_shaping_kwargs': {
+            'event_buffer_class': EventBuffer,
+            'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER},
+        } if reward_shaping_class is not None else None,
+    }
+
+    env_class = ENV_CLASSES[config['env_class']]
+    if config['vec_env'] == 'vizdoom':
+        return make_vizdoom_vec_env(env_class, config['n_envs'], env_kwargs)
+
+    vec_env_cls = SubprocVecEnv if config['vec_env'] == 'subproc' else DummyVecEnv
+    return make_vec_env(env_class, config['n_envs'], env_kwargs=env_kwargs, vec_env_cls=vec_env_cls)
+
+
+def benchmark(config: dict) -> dict:
+    """
+    Raw env throughput with a random policy, steps and resets are counted per env.
+    """
+    rng = np.random.default_rng(0)
+    env = make_env(config)
+    n_envs = env.num_envs
+
+    env.reset()
+    for _ in range(warmup_steps):
+        env.step(rng.integers(0, env.action_space.n, n_envs))
+
+    start = time.perf_counter()
+    for _ in range(benchmark_steps // n_envs):
+        env.step(rng.integers(0, env.action_space.n, n_envs))
+    steps_per_second = benchmark_steps // n_envs * n_envs / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(benchmark_resets):
+        env.reset()
+    resets_per_second = benchmark_resets * n_envs / (time.perf_counter() - start)
+
+    env.close()
+
+    return {'steps_per_second': steps_per_second, 'resets_per_second': resets_per_second}
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    regressions = []
+
+    print(f'{"":<50} {"steps/s":>9} {"baseline":>9} {"resets/s":>9} {"baseline":>9}')
+    for name, result in results.items():
+        base = baseline.get(name, {})
+        short_name = get_short_name(name)
+        print(f'{short_name:<50} {result["steps_per_second"]:9.0f} {base.get("steps_per_second", np.nan):9.0f} '
+              f'{result["resets_per_second"]:9.1f} {base.get("resets_per_second", np.nan):9.1f}')
+
+        for metric, value in result.items():
+            if metric in base and value < base[metric] * (1 - regression_tolerance):
+                regressions.append(f'{short_name}: {metric} {value:.1f} < baseline {base[metric]:.1f}')
+
+    return regressions
+
+
+def main():
+    results = {}
+    for variation in VARIATIONS:
+        config = {**BASE_CONFIG, **variation}
+        name = get_config_name(config)
+        results[name] = benchmark(config)
+        print(f'{name}: {results[name]["steps_per_second"]:.0f} steps/s, '
+              f'{results[name]["resets_per_second"]:.1f} resets/s')
+
+    report = {
+        'machine': {'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count()},
+        'results': results,
+    }
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if update_baseline or not os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline saved to {BASELINE_PATH}')
+        return
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline['results'])
+    if regressions:
+        print('Throughput regressions:')
+        for regression in regressions:
+            print(f'  {regression}')
+        raise SystemExit(1)
+
+    print('No throughput regressions')
+
+
+if __name__ == "__main__":
+    main()
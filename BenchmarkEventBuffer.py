@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+
+from EventBuffer import EventBuffer
+from ROERewardShaping import EVENTS_TYPES_NUMBER
+
+capacities = [100, 1000, 10000]
+steps = 20000
+episode_length = 500
+
+
+class ListEventBuffer:
+    """
+    Previous EventBuffer implementation, kept for comparison.
+    """
+
+    def __init__(self, n, capacity=100, event_clip=0.01):
+        self.n = n
+        self.capacity = capacity
+        self.idx = 0
+        self.events = []
+        self.event_clip = event_clip
+
+    def record_events(self, events):
+        if len(self.events) < self.capacity:
+            self.events.append(events)
+        else:
+            self.events[self.idx] = events
+            if self.idx + 1 < self.capacity:
+                self.idx += 1
+            else:
+                self.idx = 0
+
+    def intrinsic_reward(self, events):
+        if len(self.events) == 0:
+            return 0
+
+        mean = np.mean(self.events, axis=0)
+        clip = np.clip(mean, self.event_clip, np.max(mean))
+        div = np.divide(np.ones(self.n), clip)
+        mul = np.multiply(div, events)
+
+        return np.sum(mul)
+
+
+def fill(buffer, episodes):
+    for episode_events in episodes:
+        buffer.record_events(episode_events)
+
+
+def run(buffer, step_events, episodes):
+    # Intrinsic reward on every step, buffer changes only at the end of an episode
+    rewards = []
+    start = time.perf_counter()
+    for step, events in enumerate(step_events):
+        rewards.append(buffer.intrinsic_reward(events))
+        if step % episode_length == episode_length - 1:
+            buffer.record_events(episodes[step // episode_length])
+    return (time.perf_counter() - start) / len(step_events) * 1e6, np.array(rewards)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    step_events = (rng.random((steps, EVENTS_TYPES_NUMBER)) < 0.05).astype(np.float64)
+
+    for capacity in capacities:
+        episodes = rng.poisson(5, (capacity + steps // episode_length, EVENTS_TYPES_NUMBER)).astype(np.float64)
+
+        legacy = ListEventBuffer(EVENTS_TYPES_NUMBER, capacity)
+        running = EventBuffer(EVENTS_TYPES_NUMBER, capacity)
+        fill(legacy, episodes[:capacity])
+        fill(running, episodes[:capacity])
+
+        legacy_time, legacy_rewards = run(legacy, step_events, episodes[capacity:])
+        running_time, running_rewards = run(running, step_events, episodes[capacity:])
+
+        assert np.allclose(legacy_rewards, running_rewards)
+
+        print(f'capacity {capacity:>5}: list {legacy_time:8.2f} us/step, '
+              f'running mean {running_time:5.2f} us/step ({legacy_time / running_time:.0f}x)')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import time
+
+import numpy as np
+
+from ROERewardShaping import EventTable, ROE_EVENT_DEFINITIONS, EVENTS_TYPES_NUMBER, DEATH_COUNT, HEALTH, \
+    SELECTED_WEAPON_AMMO, WEAPON0, KILL_COUNT, SELECTED_WEAPON, DISTANCE_MOVED, DAMAGE_COUNT
+
+samples = 100000
+# Envs per get_events_batch call, like the number of envs of ROEVecEnvWrapper
+batch_size = 16
+
+
+def legacy_get_events(current_vars, last_vars):
+    """
+    Previous ROERewardShaping._get_events implementation, kept as reference.
+    """
+    events = np.zeros(EVENTS_TYPES_NUMBER)
+
+    if current_vars[15] > last_vars[15]:
+        return events
+
+    if current_vars[0] > last_vars[0]:
+        events[0] = 1
+
+    if current_vars[1] > last_vars[1]:
+        events[1] = 1
+
+    if current_vars[2] > last_vars[2]:
+        events[2] = 1
+
+    if current_vars[3] < last_vars[3]:
+        events[3] = 1
+
+    if current_vars[3] > last_vars[3]:
+        events[4] = 1
+
+    for i in range(4, 14):
+        if current_vars[i] > last_vars[i]:
+            events[i + 1] = 1
+
+    if current_vars[14] > last_vars[14]:
+        for i in range(0, 9):
+            if current_vars[16] == i:
+                events[15 + i] = 1
+
+    if current_vars[17] > last_vars[17]:
+        events[25] = 1
+
+    return events
+
+
+def table_get_events(event_table, current_vars, last_vars):
+    if current_vars[DEATH_COUNT] > last_vars[DEATH_COUNT]:
+        return np.zeros(EVENTS_TYPES_NUMBER)
+
+    return event_table.get_events(current_vars, last_vars)
+
+
+def table_get_events_batch(event_table, current_vars, last_vars):
+    # Envs which died have no events, like in ROEVecEnvWrapper.step_wait
+    events = np.zeros((len(current_vars), EVENTS_TYPES_NUMBER))
+    alive = current_vars[:, DEATH_COUNT] <= last_vars[:, DEATH_COUNT]
+    events[alive] = event_table.get_events_batch(current_vars[alive], last_vars[alive])
+
+    return events
+
+
+def random_variables(rng):
+    # Mostly unchanged variables with occasional increases and decreases, like consecutive game steps
+    last_vars = rng.integers(0, 10, (samples, 18)).astype(np.float64)
+    change = rng.choice([-1., 0., 1.], size=(samples, 18), p=[0.1, 0.7, 0.2])
+    current_vars = last_vars + change
+    current_vars[:, 16] = rng.integers(0, 10, samples)
+
+    return current_vars, last_vars
+
+
+def edge_case_variables():
+    """
+    Transitions random ones rarely hit: ammo use and pickup, weapon switches, kills with every weapon,
+    deaths and respawns. Keys of the changes are variable indices.
+    """
+    start = np.zeros(18)
+    start[[HEALTH, SELECTED_WEAPON_AMMO, WEAPON0 + 2, SELECTED_WEAPON]] = [100, 50, 1, 2]
+
+    def change(last, changes):
+        current = last.copy()
+        current[list(changes)] = list(changes.values())
+        return current
+
+    transitions = [(change(start, changes), start) for changes in [
+        {SELECTED_WEAPON_AMMO: 49},
+        {SELECTED_WEAPON_AMMO: 60},
+        # Switching to a weapon with more ammo and picking up another one, then to a weapon with less ammo
+        {SELECTED_WEAPON: 3, SELECTED_WEAPON_AMMO: 80, WEAPON0: 1},
+        {SELECTED_WEAPON: 1, SELECTED_WEAPON_AMMO: 10},
+        *[{SELECTED_WEAPON: weapon, KILL_COUNT: 1} for weapon in [-1, 0, 4, 8, 9, 2.5]],
+    ]]
+
+    # Death with a kill and damage on the same step, then respawn with full health and reset ammo
+    death = change(start, {DEATH_COUNT: 1, KILL_COUNT: 1, DAMAGE_COUNT: 10, HEALTH: 0, SELECTED_WEAPON_AMMO: 0})
+    respawn = change(death, {HEALTH: 100, SELECTED_WEAPON_AMMO: 50, DISTANCE_MOVED: 5})
+    transitions += [(death, start), (respawn, death)]
+
+    current_vars, last_vars = map(np.array, zip(*transitions))
+    return current_vars, last_vars
+
+
+def check_equivalence(event_table, current_vars, last_vars):
+    for current, last in zip(current_vars, last_vars):
+        expected = legacy_get_events(current, last)
+        result = table_get_events(event_table, current, last)
+        assert np.array_equal(expected, result), f'{current} {last}: {expected} != {result}'
+
+
+def check_batch_equivalence(event_table, current_vars, last_vars):
+    for start in range(0, len(current_vars), batch_size):
+        batch_current, batch_last = current_vars[start:start + batch_size], last_vars[start:start + batch_size]
+        result = table_get_events_batch(event_table, batch_current, batch_last)
+
+        for current, last, events in zip(batch_current, batch_last, result):
+            expected = legacy_get_events(current, last)
+            assert np.array_equal(expected, events), f'batch {current} {last}: {expected} != {events}'
+
+
+def time_per_call(function, event_table, current_vars, last_vars):
+    start = time.perf_counter()
+    for current, last in zip(current_vars, last_vars):
+        function(event_table, current, last)
+    return (time.perf_counter() - start) / len(current_vars) * 1e6
+
+
+def main():
+    rng = np.random.default_rng(0)
+    event_table = EventTable(ROE_EVENT_DEFINITIONS)
+    current_vars, last_vars = random_variables(rng)
+    edge_current_vars, edge_last_vars = edge_case_variables()
+
+    for current, last in [(current_vars, last_vars), (edge_current_vars, edge_last_vars)]:
+        check_equivalence(event_table, current, last)
+        check_batch_equivalence(event_table, current, last)
+    print(f'Event table matches legacy implementation on {samples} samples and {len(edge_current_vars)} edge cases, '
+          f'one by one and in batches of {batch_size}')
+
+    legacy = time_per_call(lambda _, current, last: legacy_get_events(current, last),
+                           event_table, current_vars, last_vars)
+    table = time_per_call(table_get_events, event_table, current_vars, last_vars)
+
+    print(f'legacy if chain: {legacy:6.2f} us per step')
+    print(f'event table:     {table:6.2f} us per step ({legacy / table:.2f}x)')
+
+
+if __name__ == "__main__":
+    main()
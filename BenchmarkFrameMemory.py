@@ -0,0 +1,112 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+from EventBuffer import EventBuffer
+from FrameBuffer import FrameBuffer
+from VizDoomEnv import VizDoomEnv
+from ROERewardShaping import SimpleRewardShaping, EVENTS_TYPES_NUMBER
+
+scenario = 'health_gathering'
+memory_sizes = [1, 5, 10]
+steps = 2000
+
+
+class ListFrameMemory:
+    """
+    Previous frame stack implementation (list + float64 matrix), kept for comparison.
+    """
+
+    def __init__(self, memory_size, resolution):
+        self.memory_size = memory_size
+        self.resolution = resolution
+        self.memory = []
+
+    def append_frame_to_memory(self, screen_buffer):
+        self.memory.append(screen_buffer)
+        if len(self.memory) > self.memory_size:
+            self.memory.pop(0)
+
+    def get_memory_matrix(self):
+        memory_matrix = np.zeros((self.memory_size, self.resolution[1], self.resolution[0]))
+        for i, frame in enumerate(self.memory):
+            matrix_index = self.memory_size - 1 - i
+            memory_matrix[matrix_index] = frame
+        return memory_matrix
+
+
+def measure(step_function, n_steps):
+    start = time.perf_counter()
+    for _ in range(n_steps):
+        step_function()
+    steps_per_second = n_steps / (time.perf_counter() - start)
+
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(n_steps):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step_function()
+        _, peak = tracemalloc.get_traced_memory()
+        allocated += peak - before
+    tracemalloc.stop()
+
+    return steps_per_second, allocated / n_steps
+
+
+def benchmark_frame_memory(memory_size, resolution=(160, 120)):
+    frame = np.random.randint(0, 255, (resolution[1], resolution[0]), dtype=np.uint8)
+
+    legacy = ListFrameMemory(memory_size, resolution)
+
+    def legacy_step():
+        legacy.append_frame_to_memory(frame)
+        legacy.get_memory_matrix()
+
+    frame_buffer = FrameBuffer(memory_size, resolution)
+
+    def ring_step():
+        frame_buffer.append_frame(frame)
+        frame_buffer.get_frames()
+
+    return measure(legacy_step, steps), measure(ring_step, steps)
+
+
+def benchmark_env(memory_size):
+    env = VizDoomEnv(
+        scenario,
+        frame_skip=4,
+        memory_size=memory_size,
+        reward_shaping_class=SimpleRewardShaping,
+        reward_shaping_kwargs={
+            'event_buffer_class': EventBuffer,
+            'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER}
+        }
+    )
+    env.reset()
+
+    def env_step():
+        _, _, terminated, _, _ = env.step(env.action_space.sample())
+        if terminated:
+            env.reset()
+
+    result = measure(env_step, steps)
+    env.close()
+    return result
+
+
+def main():
+    print(f'{"memory":>6} | {"list steps/s":>12} | {"list B/step":>11} | {"ring steps/s":>12} | {"ring B/step":>11}'
+          f' | {"env steps/s":>11} | {"env B/step":>10}')
+
+    for memory_size in memory_sizes:
+        (legacy_sps, legacy_bytes), (ring_sps, ring_bytes) = benchmark_frame_memory(memory_size)
+        env_sps, env_bytes = benchmark_env(memory_size)
+
+        print(f'{memory_size:>6} | {legacy_sps:>12.0f} | {legacy_bytes:>11.0f} | {ring_sps:>12.0f} | {ring_bytes:>11.0f}'
+              f' | {env_sps:>11.0f} | {env_bytes:>10.0f}')
+
+
+if __name__ == "__main__":
+    main()
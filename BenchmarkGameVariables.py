@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+
+from EventBuffer import EventBuffer
+from VizDoomEnv import VizDoomEnv
+from ROERewardShaping import ROERewardShaping, EVENTS_TYPES_NUMBER, ROE_GAME_VARIABLES
+
+scenario = 'deadly_corridor'
+steps = 3000
+
+
+def legacy_fetch(game):
+    # Two get_state calls and one get_game_variable call per variable, as before
+    if game.get_state():
+        game.get_state()
+        return np.array([game.get_game_variable(variable) for variable in ROE_GAME_VARIABLES])
+
+
+def snapshot_fetch(game, indices):
+    state = game.get_state()
+    if state:
+        return state.game_variables[indices]
+
+
+def main():
+    env = VizDoomEnv(
+        scenario,
+        frame_skip=4,
+        reward_shaping_class=ROERewardShaping,
+        reward_shaping_kwargs={
+            'event_buffer_class': EventBuffer,
+            'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER}
+        }
+    )
+    indices = env.reward_shaping.game_variable_indices
+    env.reset()
+
+    fetch_times = {'legacy': 0., 'snapshot': 0.}
+    step_time = 0.
+    for _ in range(steps):
+        start = time.perf_counter()
+        _, _, terminated, _, _ = env.step(env.action_space.sample())
+        step_time += time.perf_counter() - start
+
+        if terminated:
+            env.reset()
+
+        start = time.perf_counter()
+        legacy_fetch(env.game)
+        fetch_times['legacy'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot_fetch(env.game, indices)
+        fetch_times['snapshot'] += time.perf_counter() - start
+
+    env.close()
+
+    print(f'{scenario}, ROE reward shaping, per step:')
+    print(f'\tlegacy state + game variables fetch   {fetch_times["legacy"] / steps * 1e6:8.1f} us')
+    print(f'\tsingle state snapshot fetch           {fetch_times["snapshot"] / steps * 1e6:8.1f} us')
+    print(f'\tVizDoomEnv.step                       {step_time / steps * 1e6:8.1f} us')
+
+
+if __name__ == "__main__":
+    main()
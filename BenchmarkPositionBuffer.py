@@ -0,0 +1,84 @@
+import math
+import time
+
+import numpy as np
+
+from PositionBuffer import PositionBuffer
+
+buffer_size = 12800
+steps = 50000
+heatmap_size = (64, 64)
+heatmap_repeats = 20
+
+
+class ListPositionBuffer:
+    """
+    Previous PositionBuffer implementation, kept for comparison.
+    """
+
+    def __init__(self, buffer_size: int = 12800):
+        self.position_history: list[tuple[float, float]] = []
+        self.buffer_size = buffer_size
+        self.min_position = [0, 0]
+        self.max_position = [0, 0]
+
+    def record_position(self, position: tuple[float, float]):
+        self.position_history.append(position)
+
+        self.min_position[0] = min(self.min_position[0], position[0])
+        self.min_position[1] = min(self.min_position[1], position[1])
+
+        self.max_position[0] = max(self.max_position[0], position[0])
+        self.max_position[1] = max(self.max_position[1], position[1])
+
+        if len(self.position_history) > self.buffer_size:
+            self.position_history.pop(0)
+
+    def get_position_heat_matrix(self, size: tuple[int, int]) -> np.ndarray:
+        position_matrix = np.zeros(size)
+
+        for i, position in enumerate(self.position_history):
+            scaled_x = math.floor((position[0] - self.min_position[0]) / (self.max_position[0] - self.min_position[0]) * (size[0] - 1))
+            scaled_y = math.floor((position[1] - self.min_position[1]) / (self.max_position[1] - self.min_position[1]) * (size[1] - 1))
+
+            position_matrix[scaled_x, scaled_y] += 1
+
+        result = np.divide(position_matrix, len(self.position_history))
+        result = np.clip(result, 0, 0.25)
+        return result
+
+
+def benchmark(buffer, positions):
+    start = time.perf_counter()
+    for position in positions:
+        buffer.record_position(position)
+    record_time = (time.perf_counter() - start) / len(positions) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(heatmap_repeats):
+        heatmap = buffer.get_position_heat_matrix(heatmap_size)
+    heatmap_time = (time.perf_counter() - start) / heatmap_repeats * 1e3
+
+    return record_time, heatmap_time, heatmap
+
+
+def main():
+    rng = np.random.default_rng(0)
+    # Random walk, like agent positions
+    positions = [tuple(position) for position in np.cumsum(rng.normal(0, 8, (steps, 2)), axis=0)]
+
+    legacy_record, legacy_heatmap, legacy_result = benchmark(ListPositionBuffer(buffer_size), positions)
+    array_record, array_heatmap, array_result = benchmark(PositionBuffer(buffer_size), positions)
+
+    assert np.array_equal(legacy_result, array_result)
+
+    print(f'record_position:          list {legacy_record:6.2f} us, array {array_record:6.2f} us')
+    print(f'get_position_heat_matrix: list {legacy_heatmap:6.2f} ms, array {array_heatmap:6.2f} ms')
+
+    buffer = PositionBuffer(buffer_size)
+    buffer.record_position((0., 0.))
+    assert not np.isnan(buffer.get_position_heat_matrix(heatmap_size)).any()
+
+
+if __name__ == "__main__":
+    main()
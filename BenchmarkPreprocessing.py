@@ -0,0 +1,99 @@
+import time
+
+import cv2
+import numpy as np
+import vizdoom as vzd
+
+from EventBuffer import EventBuffer
+from VizDoomEnv import VizDoomEnv, INTERPOLATIONS
+from ROERewardShaping import SimpleRewardShaping, EVENTS_TYPES_NUMBER
+
+scenario = 'health_gathering'
+resolution = (160, 120)
+frames = 5000
+steps = 3000
+
+
+def capture_frame(screen_resolution):
+    game = vzd.DoomGame()
+    game.load_config(f'scenarios/{scenario}.cfg')
+    game.set_screen_resolution(screen_resolution)
+    game.set_screen_format(vzd.ScreenFormat.GRAY8)
+    game.set_window_visible(False)
+    game.init()
+    game.new_episode()
+    frame = game.get_state().screen_buffer.copy()
+    game.close()
+    return frame
+
+
+def time_per_frame(function):
+    start = time.perf_counter()
+    for _ in range(frames):
+        function()
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def benchmark_preprocessing():
+    frame_320 = capture_frame(vzd.ScreenResolution.RES_320X240)
+    frame_160 = capture_frame(vzd.ScreenResolution.RES_160X120)
+    out = np.zeros((resolution[1], resolution[0]), dtype=np.uint8)
+
+    results = {
+        'legacy (moveaxis + cubic, 320x240)': time_per_frame(
+            lambda: np.reshape(cv2.resize(np.moveaxis(frame_320, 0, -1), resolution, interpolation=cv2.INTER_CUBIC),
+                               (resolution[1], resolution[0])))
+    }
+
+    for name, interpolation in INTERPOLATIONS.items():
+        results[f'{name} into out (320x240)'] = time_per_frame(
+            lambda: cv2.resize(frame_320, resolution, dst=out, interpolation=interpolation))
+
+    def native_copy():
+        out[:] = frame_160
+
+    results['native copy (160x120)'] = time_per_frame(native_copy)
+
+    return results
+
+
+def benchmark_env(**kwargs):
+    env = VizDoomEnv(
+        scenario,
+        frame_skip=4,
+        resolution=resolution,
+        reward_shaping_class=SimpleRewardShaping,
+        reward_shaping_kwargs={
+            'event_buffer_class': EventBuffer,
+            'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER}
+        },
+        **kwargs
+    )
+    env.reset()
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, terminated, _, _ = env.step(env.action_space.sample())
+        if terminated:
+            env.reset()
+    steps_per_second = steps / (time.perf_counter() - start)
+
+    env.close()
+    return steps_per_second
+
+
+def main():
+    print('Preprocessing cost per frame:')
+    for name, microseconds in benchmark_preprocessing().items():
+        print(f'\t{name:<36} {microseconds:8.1f} us')
+
+    legacy = benchmark_env(native_resolution=False)
+    native = benchmark_env(native_resolution=True)
+
+    print(f'{scenario} steps/s:')
+    print(f'\tlegacy 320x240 + cubic resize       {legacy:8.0f}')
+    print(f'\tnative 160x120                      {native:8.0f} ({native / legacy:.2f}x)')
+
+
+if __name__ == "__main__":
+    main()
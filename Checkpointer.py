@@ -0,0 +1,126 @@
+import copy
+import os
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from stable_baselines3.common.base_class import BaseAlgorithm
+from stable_baselines3.common.save_util import recursive_getattr, save_to_zip_file
+
+from BackgroundWriter import BackgroundWriter
+
+
+class RetentionPolicy(NamedTuple):
+    """
+    Checkpoints kept by any of the rules are kept, without any rule all checkpoints are kept.
+    """
+    # Number of newest checkpoints to keep
+    keep_last: Optional[int] = None
+    # Checkpoints with step divisible by keep_every are kept
+    keep_every: Optional[int] = None
+    # Checkpoints with the best value of best_metric to keep, metric names are the logged ones, like emo/KILL_MONSTER
+    keep_best: int = 0
+    best_metric: Optional[str] = None
+    higher_is_better: bool = True
+
+
+class Checkpoint(NamedTuple):
+    path: str
+    step: int
+    metric: Optional[float]
+
+
+def snapshot_model(model: BaseAlgorithm) -> Dict:
+    """
+    Copy of everything BaseAlgorithm.save writes, so the model can keep training while the copy is serialized.
+    """
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for torch_var in state_dicts_names + torch_variable_names:
+        exclude.add(torch_var.split(".")[0])
+
+    for param_name in exclude:
+        data.pop(param_name, None)
+
+    pytorch_variables = {name: recursive_getattr(model, name) for name in torch_variable_names}
+
+    return copy.deepcopy({
+        'data': data,
+        'params': model.get_parameters(),
+        'pytorch_variables': pytorch_variables
+    })
+
+
+class Checkpointer:
+    """
+    Saves model snapshots in a background thread and removes checkpoints not kept by the retention policy.
+    Only checkpoints saved by this checkpointer are ever removed.
+
+    :param on_change: called in the background thread with the saved checkpoint and the removed ones
+    """
+
+    def __init__(
+            self,
+            save_path: str,
+            retention_policy: RetentionPolicy = RetentionPolicy(),
+            on_change: Optional[Callable[[List[Checkpoint], List[Checkpoint]], None]] = None
+    ):
+        self.save_path = save_path
+        self.retention_policy = retention_policy
+        self.on_change = on_change
+        self.checkpoints: List[Checkpoint] = []
+
+        # Checkpoints are never dropped, training waits if two of them are already queued
+        self.writer = BackgroundWriter(max_queue_size=2, drop_on_full=False)
+
+    def save(self, model: BaseAlgorithm, step: int, metric: Optional[float] = None):
+        path = os.path.join(self.save_path, f"best_model_{step}.zip")
+        self.writer.submit(self._write, snapshot_model(model), Checkpoint(path, step, metric))
+
+    def close(self):
+        self.writer.close()
+
+    def _write(self, snapshot: Dict, checkpoint: Checkpoint):
+        os.makedirs(self.save_path, exist_ok=True)
+
+        # Written under a temporary name, so a partial zip is never mistaken for a checkpoint
+        tmp_path = checkpoint.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            save_to_zip_file(f, **snapshot)
+        os.replace(tmp_path, checkpoint.path)
+
+        self.checkpoints.append(checkpoint)
+        removed = self._prune()
+
+        if self.on_change is not None:
+            self.on_change([checkpoint] if checkpoint not in removed else [], removed)
+
+    def _prune(self) -> List[Checkpoint]:
+        kept = self.get_kept_checkpoints()
+        removed = [checkpoint for checkpoint in self.checkpoints if checkpoint not in kept]
+
+        for checkpoint in removed:
+            if os.path.exists(checkpoint.path):
+                os.remove(checkpoint.path)
+
+        self.checkpoints = [checkpoint for checkpoint in self.checkpoints if checkpoint in kept]
+
+        return removed
+
+    def get_kept_checkpoints(self) -> List[Checkpoint]:
+        policy = self.retention_policy
+        keep_best = policy.keep_best and policy.best_metric is not None
+        if policy.keep_last is None and not policy.keep_every and not keep_best:
+            return list(self.checkpoints)
+
+        kept = self.checkpoints[max(len(self.checkpoints) - (policy.keep_last or 0), 0):]
+
+        if policy.keep_every:
+            kept += [checkpoint for checkpoint in self.checkpoints if checkpoint.step % policy.keep_every == 0]
+
+        if keep_best:
+            with_metric = [checkpoint for checkpoint in self.checkpoints if checkpoint.metric is not None]
+            with_metric.sort(key=lambda checkpoint: checkpoint.metric, reverse=policy.higher_is_better)
+            kept += with_metric[:policy.keep_best]
+
+        return [checkpoint for checkpoint in self.checkpoints if checkpoint in kept]
@@ -0,0 +1,187 @@
+import os
+from typing import Optional
+
+import cv2
+import imageio
+import numpy as np
+import vizdoom as vzd
+from PIL import Image, GifImagePlugin
+
+from BackgroundWriter import BackgroundWriter
+from VizDoomEnv import get_closest_screen_resolution, wad_path
+
+# Tics per second of the Doom engine
+DOOM_TICRATE = 35
+
+
+class GifWriter:
+    """
+    Writes every frame to the file as it comes, each with its own palette.
+    Pillow and the imageio gif writers keep all frames in memory until the file is closed.
+    """
+
+    def __init__(self, path: str, fps: float):
+        self.file = open(path, 'wb')
+        self.duration = 1000 / fps
+        self.frames = 0
+
+    def append_data(self, frame: np.ndarray):
+        if frame.ndim == 2:
+            image = Image.fromarray(frame, 'L').convert('P')
+        else:
+            image = Image.fromarray(frame[..., :3], 'RGB').quantize(256)
+
+        if self.frames == 0:
+            # Header without a global palette, followed by the looping extension
+            self.file.write(b'GIF89a' + image.size[0].to_bytes(2, 'little') + image.size[1].to_bytes(2, 'little')
+                            + b'\x00\x00\x00' + b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+        for data in GifImagePlugin.getdata(image, duration=self.duration, include_color_table=True):
+            self.file.write(data)
+        self.frames += 1
+
+    def close(self):
+        self.file.write(b';')
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_video_writer(path: str, fps: float):
+    """
+    Video writer chosen by extension, mp4 needs the imageio-ffmpeg package.
+    """
+    if path.endswith('.gif'):
+        return GifWriter(path, fps)
+
+    return imageio.get_writer(path, fps=fps)
+
+
+def to_image(screen_buffer: np.ndarray) -> np.ndarray:
+    # CRCGCB and CBCGCR screen formats are channel first
+    if screen_buffer.ndim == 3 and screen_buffer.shape[0] == 3:
+        return np.moveaxis(screen_buffer, 0, -1)
+
+    return screen_buffer
+
+
+def get_recording_path(path: str) -> str:
+    root, extension = os.path.splitext(path)
+    return root + '.recording' + extension
+
+
+class EpisodeRecorder:
+    """
+    Streams frames of episodes to a gif or mp4 file from a background thread and keeps only the best episode.
+    Every episode is written under a temporary name, which replaces the best one if the episode scores higher
+    and is removed otherwise. With demo_path, ViZDoom demos (.lmp) of the episodes are kept the same way,
+    so the best episode can be rendered again with render_demo.
+    """
+
+    def __init__(self, path: str, fps: float = 30, demo_path: Optional[str] = None, max_queue_size: int = 64):
+        self.path = path
+        self.fps = fps
+        self.demo_path = demo_path
+        self.best_score = None
+
+        self.video = None
+        # Frames are never dropped, the episode waits if the encoder falls behind
+        self.writer = BackgroundWriter(max_queue_size=max_queue_size, drop_on_full=False)
+
+    def new_episode(self) -> Optional[str]:
+        """
+        Starts recording an episode, returns the path its demo should be recorded to, if demos are kept.
+        """
+        self.writer.submit(self._open)
+
+        if self.demo_path is None:
+            return None
+
+        os.makedirs(os.path.dirname(self.demo_path) or os.path.curdir, exist_ok=True)
+        return get_recording_path(self.demo_path)
+
+    def add_frame(self, screen_buffer: np.ndarray):
+        """
+        Frames are encoded later, so screen_buffer must not be modified afterwards.
+        """
+        self.writer.submit(self._append, screen_buffer)
+
+    def end_episode(self, score: float) -> bool:
+        """
+        Finishes the episode, its demo must be already written, so the env has to be reset or closed before.
+        Returns whether it is the best episode so far.
+        """
+        is_best = self.best_score is None or score > self.best_score
+        if is_best:
+            self.best_score = score
+
+        self.writer.submit(self._finish, is_best)
+
+        return is_best
+
+    def close(self):
+        self.writer.close()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or os.path.curdir, exist_ok=True)
+        self.video = open_video_writer(get_recording_path(self.path), self.fps)
+
+    def _append(self, screen_buffer: np.ndarray):
+        self.video.append_data(to_image(screen_buffer))
+
+    def _finish(self, is_best: bool):
+        self.video.close()
+        self.video = None
+
+        paths = [self.path] if self.demo_path is None else [self.path, self.demo_path]
+        for path in paths:
+            recording_path = get_recording_path(path)
+            if not os.path.exists(recording_path):
+                continue
+
+            if is_best:
+                os.replace(recording_path, path)
+            else:
+                os.remove(recording_path)
+
+
+def render_demo(
+        demo_path: str,
+        output_path: str,
+        scenario: str,
+        resolution: tuple[int, int] = (640, 480),
+        frame_interval: int = 1,
+        game_args: str = ''
+):
+    """
+    Renders a ViZDoom demo to a gif or mp4 file at any resolution, every frame_interval tics.
+    The scenario and game_args must be the ones the demo was recorded with.
+    """
+    game = vzd.DoomGame()
+    game.load_config(os.path.join(os.path.curdir, "scenarios", scenario + ".cfg"))
+
+    if os.path.exists(wad_path):
+        game.set_doom_game_path(wad_path)
+
+    game.set_screen_resolution(get_closest_screen_resolution(resolution))
+    game.set_screen_format(vzd.ScreenFormat.RGB24)
+    game.add_game_args(game_args)
+    game.set_window_visible(False)
+    game.init()
+
+    game.replay_episode(demo_path)
+
+    with open_video_writer(output_path, DOOM_TICRATE / frame_interval) as video:
+        while not game.is_episode_finished():
+            frame = game.get_state().screen_buffer
+            if frame.shape[:2] != (resolution[1], resolution[0]):
+                frame = cv2.resize(frame, resolution, interpolation=cv2.INTER_AREA)
+
+            video.append_data(frame)
+            game.advance_action(frame_interval)
+
+    game.close()
@@ -1,32 +1,28 @@
 import os
-import time
 
 from rich.progress import Progress
 
+from EvaluationEngine import EvaluationJob, ComparisonJob, SequentialStopping, evaluate_jobs
 from EventBuffer import EventBuffer
-from VizDoomEnv import VizDoomEnv
-from stable_baselines3 import PPO, A2C
 from ROERewardShaping import ROERewardShaping, EVENTS_TYPES_NUMBER
+from RunRegistry import RunRegistry
 
 import numpy as np
 
-baseline_models = {
-    'health_gathering': 'model/final/baseline/sep_buffer/basic_action/mem_1/health_gathering/best_model_2500000.zip',
-    'health_gathering_supreme': 'model/final/baseline/sep_buffer/basic_action/mem_1/health_gathering_supreme/best_model_2500000.zip',
-    'my_way_home': 'model/final/baseline/sep_buffer/basic_action/mem_1/my_way_home/best_model_2500000.zip',
-    'deadly_corridor': 'model/final/baseline/sep_buffer/basic_action/mem_1/deadly_corridor/best_model_2500000.zip',
-    'simple_deathmatch': 'model/final/baseline/sep_buffer/basic_action/mem_1/simple_deathmatch/best_model_2300000.zip',
-    'deathmatch': 'model/final/baseline/sep_buffer/basic_action/mem_1/deathmatch/best_model_600000.zip'
-}
-
-roe_models = {
-    'health_gathering': 'model/final/ROE/sep_buffer/basic_action/mem_1/health_gathering/best_model_2500000.zip',
-    'health_gathering_supreme': 'model/final/ROE/sep_buffer/basic_action/mem_1/health_gathering_supreme/best_model_2500000.zip',
-    'my_way_home': 'model/final/ROE/sep_buffer/basic_action/mem_1/my_way_home/best_model_2500000.zip',
-    'deadly_corridor': 'model/final/ROE/sep_buffer/basic_action/mem_1/deadly_corridor/best_model_2500000.zip',
-    'simple_deathmatch': 'model/final/ROE/sep_buffer/basic_action/mem_1/simple_deathmatch/best_model_2500000.zip',
-    'deathmatch': 'model/final/ROE/sep_buffer/basic_action/mem_1/deathmatch/best_model_600000.zip'
-}
+# Compared runs, their latest checkpoints are taken from the run registry. Run RunRegistry.py to index existing runs.
+BASELINE_RUN = {'name': 'baseline', 'shared_buffer': False, 'advanced_actions': False, 'memory_size': 1}
+ROE_RUN = {'name': 'ROE', 'shared_buffer': False, 'advanced_actions': False, 'memory_size': 1}
+
+n_episodes = 10
+# Every evaluated step is recorded to TRAJECTORY_DIR/<model>/<scenario>, see TrajectoryRecorder
+record_trajectories = False
+TRAJECTORY_DIR = os.path.join(os.path.curdir, 'trajectories')
+# Envs evaluating each model, scenarios are evaluated in parallel too
+n_envs = 4
+
+# Sequential evaluation, baseline and ROE models are compared until the difference of their means is known well enough
+sequential = False
+stopping = SequentialStopping(relative_ci_width=0.1, min_episodes=5, max_episodes=100)
 
 scenarios = [
     ('health_gathering', 'Health gathering'),
@@ -38,69 +34,83 @@ scenarios = [
 ]
 
 
-def main():
-    results = [{}, {}]
-
-    with Progress() as progress:
-        whole_task = progress.add_task('[green]Whole...', total=len(scenarios) * 2)
-
-        for i, models in enumerate([baseline_models, roe_models]):
-            for scenario, scenario_name in scenarios:
-                model_dir = models[scenario]
-
-                if model_dir is None:
-                    results[i][scenario] = (None, None)
-                    continue
-
-                model = A2C.load(model_dir)
+def format_result(mean, std) -> str:
+    # Scenarios without a model in the registry
+    if mean is None:
+        return '-'
 
-                env = VizDoomEnv(
-                    scenario,
-                    is_window_visible=False,
-                    doom_skill=3,
-                    memory_size=1,
-                    advanced_actions=False,
+    return f'${mean:.3g} \\pm {std:.3g}$'
 
-                    reward_shaping_class=ROERewardShaping,
-                    reward_shaping_kwargs={
-                        'event_buffer_class': EventBuffer,
-                        'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER}
-                    }
-                )
-                env.frame_skip = 1
 
-                sub_task = progress.add_task(f'[blue]{scenario}...', total=10)
-                episode_results = []
-
-                for episode in range(10):
-                    progress.update(sub_task, advance=1)
-                    progress.refresh()
-
-                    obs, _ = env.reset()
-                    action, _ = model.predict(obs)
-
-                    terminated = False
+def main():
+    env_kwargs = {
+        'is_window_visible': False,
+        'doom_skill': 3,
+        'frame_skip': 1,
+        'memory_size': 1,
+        'advanced_actions': False,
+        'native_resolution': False,
+
+        'reward_shaping_class': ROERewardShaping,
+        'reward_shaping_kwargs': {
+            'event_buffer_class': EventBuffer,
+            'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER}
+        }
+    }
+
+    registry = RunRegistry()
+    baseline_models = {scenario: registry.get_latest_checkpoint(scenario=scenario, **BASELINE_RUN)
+                       for scenario, _ in scenarios}
+    roe_models = {scenario: registry.get_latest_checkpoint(scenario=scenario, **ROE_RUN) for scenario, _ in scenarios}
 
-                    step = 0
-                    while not terminated:
-                        if step % 4 == 0:
-                            action, _ = model.predict(obs)
+    results = [{}, {}]
+    # Number of evaluated episodes
+    episodes = [{}, {}]
+    jobs = []
+    job_keys = []
 
-                        obs, reward, terminated, _, info = env.step(action)
+    for scenario, scenario_name in scenarios:
+        model_jobs = []
+        for i, models in enumerate([baseline_models, roe_models]):
+            if models[scenario] is None:
+                results[i][scenario] = (None, None)
+                continue
+
+            job_env_kwargs = env_kwargs
+            if record_trajectories:
+                job_env_kwargs = {**env_kwargs,
+                                  'trajectory_path': os.path.join(TRAJECTORY_DIR, ['baseline', 'roe'][i], scenario)}
+
+            model_jobs.append((i, EvaluationJob(models[scenario], scenario, job_env_kwargs, n_episodes=n_episodes,
+                                                n_envs=n_envs, stopping=stopping if sequential else None)))
+
+        if sequential and len(model_jobs) == 2:
+            jobs.append(ComparisonJob(model_jobs[0][1], model_jobs[1][1], stopping))
+            job_keys.append(([0, 1], scenario))
+        else:
+            for i, job in model_jobs:
+                jobs.append(job)
+                job_keys.append(([i], scenario))
 
-                        step += 1
-                        # time.sleep(1 / (30. * 4))
+    with Progress() as progress:
+        whole_task = progress.add_task('[green]Whole...', total=len(jobs))
 
-                    stats = env.get_statistics()
-                    episode_results.append(stats['extrinsic_reward'])
+        def on_job_done(job_idx, job_results):
+            model_indices, scenario = job_keys[job_idx]
+            if len(model_indices) == 1:
+                job_results = [job_results]
 
-                env.close()
-                model = None
+            for i, episode_results in zip(model_indices, job_results):
+                progress.print(f'{scenario}: {episode_results}')
+                results[i][scenario] = (np.mean(episode_results), np.std(episode_results))
+                episodes[i][scenario] = len(episode_results)
+            progress.advance(whole_task, advance=1)
 
-                progress.advance(whole_task, advance=1)
+        evaluate_jobs(jobs, on_job_done=on_job_done)
 
-                print(episode_results)
-                results[i][scenario] = (np.mean(episode_results), np.std(episode_results))
+    if sequential:
+        for scenario, scenario_name in scenarios:
+            print(f'{scenario_name}: {episodes[0].get(scenario)} VizDoom and {episodes[1].get(scenario)} ROE episodes')
 
     print('\\begin{table}[H]')
     print('\t\\begin{tabular}{|| c | c | c ||}')
@@ -108,8 +118,8 @@ def main():
     print('\t\tscenario & VizDoom & ROE \\\\')
     print('\t\t\\hline\\hline')
     for scenario, scenario_name in scenarios:
-        print(f'\t\t{scenario_name} & ${results[0][scenario][0]:.3g} \\pm {results[0][scenario][1]:.3g}$ &'
-              f' ${results[1][scenario][0]:.3g} \\pm {results[1][scenario][1]:.3g}$ \\\\')
+        print(f'\t\t{scenario_name} & {format_result(*results[0][scenario])} &'
+              f' {format_result(*results[1][scenario])} \\\\')
         print('\t\t\\hline')
 
     print('\t\\end{tabular}')
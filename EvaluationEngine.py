@@ -0,0 +1,310 @@
+import functools
+import math
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from stable_baselines3 import A2C
+
+from TrainScheduler import get_available_cpus
+from VizDoomEnv import VizDoomEnv
+from VizDoomVecEnv import make_vizdoom_vec_env
+
+
+class SequentialStopping(NamedTuple):
+    """
+    Episodes are sampled until the confidence interval of the mean, or of the difference of means in a comparison,
+    is narrow enough. Without any width target only max_episodes or a decided comparison stops the evaluation.
+    """
+    # Full width of the confidence interval
+    ci_width: Optional[float] = None
+    # Full width of the confidence interval relative to the absolute mean, the larger one in a comparison
+    relative_ci_width: Optional[float] = None
+    confidence: float = 0.95
+    # At least 2, the width of the interval is not known from one episode
+    min_episodes: int = 5
+    max_episodes: int = 100
+    # Comparisons also stop when the interval of the difference does not contain 0
+    stop_when_decided: bool = True
+
+
+class EvaluationJob(NamedTuple):
+    model_path: str
+    scenario: str
+    env_kwargs: Dict[str, Any]
+    n_episodes: int = 10
+    n_envs: int = 4
+    # Env ticks between two model decisions, the action is repeated in between by the env
+    decision_interval: int = 4
+    # Episode statistic used as the result
+    statistic: str = 'extrinsic_reward'
+    # Sequential evaluation instead of a fixed n_episodes
+    stopping: Optional[SequentialStopping] = None
+
+
+class ComparisonJob(NamedTuple):
+    """
+    Two models evaluated side by side until the difference of their means is known well enough.
+    """
+    first: EvaluationJob
+    second: EvaluationJob
+    stopping: SequentialStopping
+
+
+# Up to this number of degrees of freedom t quantiles are exact, the Cornish-Fisher expansion is too narrow for few
+EXACT_T_MAX_DOF = 30
+
+
+def _t_central_probability(theta: float, dof: int) -> float:
+    """
+    P(|T| < sqrt(dof) * tan(theta)) of Student's t distribution with integer dof, Abramowitz and Stegun 26.7.3-4.
+    """
+    cos_squared = math.cos(theta) ** 2
+    total = 0.
+    if dof % 2 == 0:
+        term = 1.
+        for k in range(dof // 2):
+            total += term
+            term *= (2 * k + 1) / (2 * k + 2) * cos_squared
+        return math.sin(theta) * total
+
+    term = math.cos(theta)
+    for k in range((dof - 1) // 2):
+        total += term
+        term *= (2 * k + 2) / (2 * k + 3) * cos_squared
+    return 2 / math.pi * (theta + math.sin(theta) * total)
+
+
+@functools.lru_cache(maxsize=None)
+def _exact_t_quantile(p: float, dof: int) -> float:
+    # The central probability grows with theta, so theta of the quantile is found by bisection
+    low, high = 0., math.pi / 2
+    for _ in range(100):
+        middle = (low + high) / 2
+        if _t_central_probability(middle, dof) < abs(2 * p - 1):
+            low = middle
+        else:
+            high = middle
+
+    return math.copysign(math.sqrt(dof) * math.tan((low + high) / 2), p - 0.5)
+
+
+def t_quantile(p: float, dof: float) -> float:
+    """
+    Quantile of Student's t distribution. Exact up to EXACT_T_MAX_DOF, with fractional dof (of Welch intervals)
+    rounded down, so the interval is a bit wider, not narrower. Above it, Cornish-Fisher expansion around the normal
+    quantile.
+    """
+    if dof < 1:
+        raise ValueError(f'Student\'s t distribution needs at least 1 degree of freedom, got {dof}')
+
+    if dof <= EXACT_T_MAX_DOF:
+        return _exact_t_quantile(p, int(dof))
+
+    z = NormalDist().inv_cdf(p)
+    return (z + (z ** 3 + z) / (4 * dof)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+def confidence_interval(values: List[float], confidence: float) -> Tuple[float, float]:
+    """
+    Mean and half width of its confidence interval, the half width is infinite for less than 2 values.
+    """
+    n = len(values)
+    if n < 2:
+        return float(np.mean(values)) if n else math.nan, math.inf
+
+    standard_error = np.std(values, ddof=1) / np.sqrt(n)
+    return float(np.mean(values)), t_quantile(0.5 + confidence / 2, n - 1) * standard_error
+
+
+def difference_confidence_interval(first: List[float], second: List[float], confidence: float) \
+        -> Tuple[float, float]:
+    """
+    Difference of means (second - first) and half width of its Welch confidence interval,
+    the half width is infinite if either model has less than 2 values.
+    """
+    if len(first) < 2 or len(second) < 2:
+        difference = float(np.mean(second) - np.mean(first)) if first and second else math.nan
+        return difference, math.inf
+
+    variance_first = np.var(first, ddof=1) / len(first)
+    variance_second = np.var(second, ddof=1) / len(second)
+    variance = variance_first + variance_second
+
+    difference = float(np.mean(second) - np.mean(first))
+    if variance == 0:
+        return difference, 0.
+
+    dof = variance ** 2 / (variance_first ** 2 / (len(first) - 1) + variance_second ** 2 / (len(second) - 1))
+    return difference, t_quantile(0.5 + confidence / 2, dof) * np.sqrt(variance)
+
+
+def check_stopping(stopping: SequentialStopping):
+    if stopping.min_episodes < 2:
+        raise ValueError(f'SequentialStopping needs min_episodes >= 2, got {stopping.min_episodes}')
+    if stopping.max_episodes < stopping.min_episodes:
+        raise ValueError(f'SequentialStopping max_episodes {stopping.max_episodes} is less than min_episodes '
+                         f'{stopping.min_episodes}')
+
+
+def is_narrow_enough(half_width: float, scale: float, stopping: SequentialStopping) -> bool:
+    if stopping.ci_width is not None and 2 * half_width <= stopping.ci_width:
+        return True
+
+    return stopping.relative_ci_width is not None and 2 * half_width <= stopping.relative_ci_width * scale
+
+
+class ModelEvaluator:
+    """
+    Envs of one evaluation job, stepped one decision at a time with one predict call for all envs.
+    """
+
+    def __init__(self, job: EvaluationJob, n_envs: int):
+        if job.decision_interval < 1:
+            raise ValueError(f'EvaluationJob.decision_interval must be at least 1, got {job.decision_interval}')
+
+        self.job = job
+        self.model = A2C.load(job.model_path)
+        self.env = make_vizdoom_vec_env(VizDoomEnv, n_envs, {
+            'scenario': job.scenario, **job.env_kwargs, 'decision_interval': job.decision_interval
+        })
+
+        self.episode_results = [[] for _ in range(n_envs)]
+        self.obs = self.env.reset()
+
+    def step(self):
+        actions, _ = self.model.predict(self.obs)
+        self.obs, _, dones, infos = self.env.step(actions)
+
+        for env_idx in np.flatnonzero(dones):
+            self.episode_results[env_idx].append(infos[env_idx]['episode_statistics'][self.job.statistic])
+
+    def get_results(self) -> List[float]:
+        """
+        Results in round-robin order over envs, up to the first missing one. Short episodes finish first,
+        so counting finished episodes in completion order would overrepresent them.
+        """
+        rounds = min(len(results) for results in self.episode_results)
+        ordered = [results[i] for i in range(rounds) for results in self.episode_results]
+
+        for results in self.episode_results:
+            if len(results) == rounds:
+                break
+            ordered.append(results[rounds])
+
+        return ordered
+
+    def close(self):
+        self.env.close()
+
+
+def evaluate(job: EvaluationJob) -> List[float]:
+    """
+    Evaluates a model on job.n_envs envs in worker processes, for n_episodes or until stopping is satisfied.
+    """
+    torch.set_num_threads(1)
+
+    stopping = job.stopping
+    if stopping is not None:
+        check_stopping(stopping)
+    max_episodes = stopping.max_episodes if stopping is not None else job.n_episodes
+    evaluator = ModelEvaluator(job, min(job.n_envs, max_episodes))
+
+    while True:
+        evaluator.step()
+        results = evaluator.get_results()
+
+        if len(results) >= max_episodes:
+            results = results[:max_episodes]
+            break
+
+        if stopping is not None and len(results) >= stopping.min_episodes:
+            mean, half_width = confidence_interval(results, stopping.confidence)
+            if is_narrow_enough(half_width, abs(mean), stopping):
+                break
+
+    evaluator.close()
+
+    return results
+
+
+def compare(job: ComparisonJob) -> Tuple[List[float], List[float]]:
+    """
+    Evaluates both models of the job until the confidence interval of the difference of their means is narrow
+    enough, the comparison is decided or max_episodes of both models are done.
+    """
+    torch.set_num_threads(1)
+
+    stopping = job.stopping
+    check_stopping(stopping)
+    evaluators = [ModelEvaluator(evaluation_job, min(evaluation_job.n_envs, stopping.max_episodes))
+                  for evaluation_job in (job.first, job.second)]
+
+    while True:
+        results = []
+        for evaluator in evaluators:
+            if len(evaluator.get_results()) < stopping.max_episodes:
+                evaluator.step()
+            results.append(evaluator.get_results()[:stopping.max_episodes])
+
+        if all(len(model_results) >= stopping.max_episodes for model_results in results):
+            break
+
+        if all(len(model_results) >= stopping.min_episodes for model_results in results):
+            difference, half_width = difference_confidence_interval(*results, stopping.confidence)
+            if is_narrow_enough(half_width, max(abs(np.mean(model_results)) for model_results in results), stopping):
+                break
+            if stopping.stop_when_decided and abs(difference) > half_width:
+                break
+
+    for evaluator in evaluators:
+        evaluator.close()
+
+    return results[0], results[1]
+
+
+def run_job(job: Union[EvaluationJob, ComparisonJob]):
+    if isinstance(job, ComparisonJob):
+        return compare(job)
+
+    return evaluate(job)
+
+
+def get_job_envs(job: Union[EvaluationJob, ComparisonJob]) -> int:
+    if isinstance(job, ComparisonJob):
+        return job.first.n_envs + job.second.n_envs
+
+    return job.n_envs
+
+
+def evaluate_jobs(
+        jobs: List[Union[EvaluationJob, ComparisonJob]],
+        max_workers: Optional[int] = None,
+        on_job_done: Optional[Callable[[int, Any], None]] = None
+) -> List[Any]:
+    """
+    Runs evaluation jobs in parallel processes, by default as many as there are CPUs for their envs.
+    Results are lists of episode results, or pairs of them for comparison jobs.
+
+    :param on_job_done: called with the job index and its results when a job finishes
+    """
+    if max_workers is None:
+        max_envs = max(get_job_envs(job) for job in jobs)
+        max_workers = max(len(get_available_cpus()) // (max_envs + 1), 1)
+
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context('spawn')) as executor:
+        futures = {executor.submit(run_job, job): job_idx for job_idx, job in enumerate(jobs)}
+
+        for future in as_completed(futures):
+            job_idx = futures[future]
+            results[job_idx] = future.result()
+            if on_job_done is not None:
+                on_job_done(job_idx, results[job_idx])
+
+    return results
@@ -6,32 +6,50 @@ class EventBuffer:
         self.n = n
         self.capacity = capacity
         self.idx = 0
-        self.events = []
+        self.size = 0
+        self.events = np.zeros((capacity, n))
+        self.events_sum = np.zeros(n)
         self.event_clip = event_clip
 
+        # Reciprocal event means, recomputed only when the buffer changes
+        self.weights = None
+
     def record_events(self, events):
-        if len(self.events) < self.capacity:
-            self.events.append(events)
+        if self.size < self.capacity:
+            self.size += 1
         else:
-            self.events[self.idx] = events
-            if self.idx + 1 < self.capacity:
-                self.idx += 1
-            else:
-                self.idx = 0
+            self.events_sum -= self.events[self.idx]
+
+        self.events[self.idx] = events
+        self.events_sum += self.events[self.idx]
+        self.idx = (self.idx + 1) % self.capacity
+
+        self.weights = None
 
     def intrinsic_reward(self, events):
-        if len(self.events) == 0:
+        if self.size == 0:
             return 0
 
-        mean = np.mean(self.events, axis=0)
-        clip = np.clip(mean, self.event_clip, np.max(mean))
-        div = np.divide(np.ones(self.n), clip)
-        mul = np.multiply(div, events)
+        return self._get_weights() @ events
+
+    def intrinsic_rewards(self, events):
+        """
+        Intrinsic rewards of many envs, events have shape (n_envs, n).
+        """
+        if self.size == 0:
+            return np.zeros(len(events))
+
+        return events @ self._get_weights()
+
+    def _get_weights(self):
+        if self.weights is None:
+            mean = self.get_event_mean()
+            clip = np.clip(mean, self.event_clip, np.max(mean))
+            self.weights = np.divide(np.ones(self.n), clip)
 
-        return np.sum(mul)
+        return self.weights
 
     def get_event_mean(self):
-        if len(self.events) == 0:
+        if self.size == 0:
             return np.zeros(self.n)
-        mean = np.mean(self.events, axis=0)
-        return mean
+        return self.events_sum / self.size
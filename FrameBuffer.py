@@ -0,0 +1,28 @@
+import numpy as np
+
+
+class FrameBuffer:
+    def __init__(self, memory_size: int, resolution: tuple[int, int]):
+        self.memory_size = memory_size
+        self.resolution = resolution
+
+        # Ring buffer stored twice, so the newest memory_size frames
+        # are always available as one contiguous slice without copying.
+        self.frames = np.zeros((2 * memory_size, resolution[1], resolution[0]), dtype=np.uint8)
+        self.head = 0
+
+    def next_frame(self) -> np.ndarray:
+        # Slot for the new frame, it has to be written in place and then committed with commit_frame()
+        self.head = (self.head - 1) % self.memory_size
+        return self.frames[self.head]
+
+    def commit_frame(self):
+        self.frames[self.head + self.memory_size] = self.frames[self.head]
+
+    def append_frame(self, frame):
+        self.next_frame()[:] = frame
+        self.commit_frame()
+
+    def get_frames(self) -> np.ndarray:
+        # Newest frame first. Returned array is a view, which is overwritten by next append_frame.
+        return self.frames[self.head:self.head + self.memory_size]
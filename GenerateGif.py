@@ -1,17 +1,21 @@
 import os
-import time
 
+from EpisodeRecorder import EpisodeRecorder, render_demo
 from EventBuffer import EventBuffer
 from VizDoomEnv import VizDoomEnv
 from rich.progress import track
 from stable_baselines3 import A2C
 from ROERewardShaping import ROERewardShaping, EVENTS_TYPES_NUMBER
-import imageio
 
 scenario = 'deadly_corridor'
+n_runs = 1
 
 GIF_DIR = os.path.join('./', 'giphy', scenario)
-GIF_PATH = os.path.join(GIF_DIR, f'test.gif')
+GIF_PATH = os.path.join(GIF_DIR, 'test.gif')
+# Demo of the best run, rendered again at render_resolution if it is not None
+DEMO_PATH = os.path.join(GIF_DIR, 'test.lmp')
+render_resolution = (640, 480)
+RENDER_PATH = os.path.join(GIF_DIR, f'test_{render_resolution[0]}x{render_resolution[1]}.gif')
 MODEL_DIR = "model/final/MEM_TEST/sep_buffer/adv_action/mem_10/simple_deathmatch/best_model_2500000.zip"
 
 
@@ -20,10 +24,14 @@ def main():
 
     env = VizDoomEnv(
         scenario,
-        is_window_visible=True,
+        frame_skip=1,
+        is_window_visible=False,
         doom_skill=3,
         memory_size=1,
         advanced_actions=False,
+        native_resolution=False,
+        # Gif frames are taken every 2 tics, the model decides every 4 tics
+        decision_interval=2,
 
         reward_shaping_class=ROERewardShaping,
         reward_shaping_kwargs={
@@ -31,16 +39,11 @@ def main():
             'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER}
         }
     )
-    env.frame_skip = 1
 
-    runs = []
-    rewards = []
+    recorder = EpisodeRecorder(GIF_PATH, fps=30, demo_path=DEMO_PATH)
 
-    for _ in track(range(1)):
-        images = []
-
-        obs, _ = env.reset()
-        action, _ = model.predict(obs)
+    for _ in track(range(n_runs)):
+        obs, _ = env.reset(options={'recording_path': recorder.new_episode()})
 
         terminated = False
 
@@ -48,27 +51,28 @@ def main():
 
         i = 0
         while not terminated:
-            if i % 4 == 0:
+            if i % 2 == 0:
                 action, _ = model.predict(obs)
 
             obs, reward, terminated, _, info = env.step(action)
 
-            if not terminated and i % 2 == 0:
-                images.append(env.game.get_state().screen_buffer)
+            if not terminated:
+                recorder.add_frame(env.game.get_state().screen_buffer)
 
             reward_sum += reward
             i += 1
-            time.sleep(1 / (30. * 4))
 
-        runs.append(images)
-        rewards.append(reward_sum)
+        # The demo is written when the next episode starts
+        env.new_episode()
+        recorder.end_episode(reward_sum)
 
-    index_max = max(range(len(rewards)), key=rewards.__getitem__)
+    env.close()
+    recorder.close()
 
-    os.makedirs(GIF_DIR, exist_ok=True)
-    imageio.mimsave(GIF_PATH, runs[index_max], fps=30)
+    print(f'Best run reward: {recorder.best_score}')
 
-    env.close()
+    if render_resolution is not None:
+        render_demo(DEMO_PATH, RENDER_PATH, scenario, render_resolution)
 
 
 if __name__ == "__main__":
@@ -1,55 +1,199 @@
-import math
+import functools
+import hashlib
+import multiprocessing as mp
 import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import matplotlib
+
+# Figures are only saved, so no window system is needed
+matplotlib.use('Agg')
 
 import matplotlib.pyplot as plt
 import numpy as np
 
-from sympy.physics.control.control_plots import matplotlib
+from RunRegistry import RunRegistry
+from TrainScheduler import get_available_cpus
 
 SMOOTHING_VALUE = 0.95
+# Points of each plotted curve after downsampling, None plots all points
+max_plot_points = 2000
+# Points smoothed at once by one matrix product, SMOOTHING_VALUE ** EMA_BLOCK_SIZE must not underflow
+EMA_BLOCK_SIZE = 256
 
+PROGRESS_CACHE_DIR = os.path.join(os.path.curdir, 'cache', 'progress')
+MTIME_KEY = '__mtime_ns__'
 
-def read_csf_to_dict(file_path: str):
-    return np.genfromtxt(file_path, delimiter=',', names=True)
+# Renders all figures, even the ones newer than their logs
+force = False
 
 
-def smooth(scalars: list[float], weight: float) -> list[float]:
+def read_csf_to_dict(file_path: str) -> dict[str, np.ndarray]:
+    """
+    Columns of a progress.csv, named the way np.genfromtxt names them, like timetotal_timesteps.
+    The csv is parsed once into an npz cache, which is rebuilt when the csv is modified.
+    """
+    return _read_progress(os.path.abspath(file_path), os.stat(file_path).st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=None)
+def _read_progress(path: str, mtime_ns: int) -> dict[str, np.ndarray]:
+    cache_path = os.path.join(PROGRESS_CACHE_DIR, hashlib.sha1(path.encode()).hexdigest() + '.npz')
+
+    columns = None
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if cached[MTIME_KEY] == mtime_ns:
+                columns = {name: cached[name] for name in cached.files if name != MTIME_KEY}
+
+    if columns is None:
+        data = np.atleast_1d(np.genfromtxt(path, delimiter=',', names=True))
+        columns = {name: np.ascontiguousarray(data[name]) for name in data.dtype.names}
+        _save_progress(columns, mtime_ns, cache_path)
+
+    # Shared by all plots of the process
+    for column in columns.values():
+        column.flags.writeable = False
+    return columns
+
+
+def _save_progress(columns: dict[str, np.ndarray], mtime_ns: int, path: str):
+    os.makedirs(PROGRESS_CACHE_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **columns, **{MTIME_KEY: np.int64(mtime_ns)})
+    os.replace(tmp_path, path)
+
+
+def smooth(scalars: list[float], weight: float) -> np.ndarray:
     """
     EMA implementation according to
     https://github.com/tensorflow/tensorboard/blob/34877f15153e1a2087316b9952c931807a122aa7/tensorboard/components/vz_line_chart2/line-chart.ts#L699
+    The recurrence is a linear filter, applied to blocks of points with a matrix product,
+    the last value of each block is carried to the next one.
     """
-    last = 0
-    smoothed = []
-    num_acc = 0
-    for next_val in scalars:
-        last = last * weight + (1 - weight) * next_val
-        num_acc += 1
-        # de-bias
-        debias_weight = 1
-        if weight != 1:
-            debias_weight = 1 - math.pow(weight, num_acc)
-        smoothed_val = last / debias_weight
-        smoothed.append(smoothed_val)
+    values = np.asarray(scalars, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return values.copy()
+
+    # As in the recurrence, everything after the first NaN is NaN
+    nans = np.isnan(values)
+
+    block_size = min(EMA_BLOCK_SIZE, n)
+    blocks = np.zeros(-(-n // block_size) * block_size)
+    blocks[:n] = np.where(nans, 0, values)
+    blocks = blocks.reshape(-1, block_size)
+
+    offsets = np.arange(block_size)
+    lags = offsets[:, np.newaxis] - offsets[np.newaxis, :]
+    kernel = np.where(lags >= 0, (1 - weight) * weight ** np.maximum(lags, 0), 0)
+
+    smoothed = blocks @ kernel.T
+    carry_weights = weight ** (offsets + 1)
+    for i in range(1, len(smoothed)):
+        smoothed[i] += carry_weights * smoothed[i - 1, -1]
+    smoothed = smoothed.ravel()[:n]
+
+    # de-bias
+    if weight != 1:
+        smoothed /= 1 - weight ** np.arange(1, n + 1)
+
+    if nans.any():
+        smoothed[np.argmax(nans):] = np.nan
 
     return smoothed
 
 
-def generate_compare_plots(data_dirs, data_name, data_human_readable_name):
-    scenarios = os.listdir(data_dirs[0])
-    for scenario in scenarios:
-        datas = []
-        for data_dir in data_dirs:
-            scenario_path_one = os.path.join(data_dir, scenario, 'progress.csv')
-            datas.append(read_csf_to_dict(scenario_path_one))
+class Comparison(NamedTuple):
+    """
+    Metrics of the selected runs plotted together, one figure per metric and scenario.
+    """
+    out_dir: str
+    # Run selections for RunRegistry.find_runs, without the scenario
+    runs: list[dict]
+    # Pairs of metric name and its human readable name
+    metrics: list[tuple[str, str]]
+
+
+class RunFigure(NamedTuple):
+    """
+    Metric of one run, selected like in RunRegistry.find_run.
+    """
+    run: dict
+    save_path: str
+    data_name: str
+    data_human_readable_name: str
+
+
+class Figure(NamedTuple):
+    # progress.csv files of the figure
+    inputs: list[str]
+    save_path: str
+    data_name: str
+    data_human_readable_name: str
+    single_value: bool = False
+
+
+def get_progress_paths(registry: RunRegistry, selection: dict) -> dict[str, str]:
+    """
+    progress.csv files of the selected runs by scenario.
+    """
+    runs = registry.find_runs(**selection)
+    progress_paths = {run.scenario: os.path.join(run.get_log_dir(), 'progress.csv') for run in runs}
+
+    return {scenario: path for scenario, path in progress_paths.items() if os.path.exists(path)}
+
+
+def get_comparison_figures(comparison: Comparison, registry: RunRegistry) -> list[Figure]:
+    runs_progress_paths = [get_progress_paths(registry, selection) for selection in comparison.runs]
+
+    # Only scenarios logged by all runs can be compared
+    scenarios = sorted(set.intersection(*(set(progress_paths) for progress_paths in runs_progress_paths)))
+    if not scenarios:
+        print(f'Missing logs, skipping {comparison.out_dir}')
+
+    return [
+        Figure([progress_paths[scenario] for progress_paths in runs_progress_paths],
+               os.path.join(comparison.out_dir, data_name, f'{scenario}.png'), data_name, data_human_readable_name)
+        for data_name, data_human_readable_name in comparison.metrics
+        for scenario in scenarios
+    ]
+
+
+def get_run_figure(run_figure: RunFigure, registry: RunRegistry) -> list[Figure]:
+    run = registry.find_run(**run_figure.run)
+    progress_path = None if run is None else os.path.join(run.get_log_dir(), 'progress.csv')
+    if progress_path is None or not os.path.exists(progress_path):
+        print(f'Missing logs, skipping {run_figure.save_path}')
+        return []
+
+    return [Figure([progress_path], run_figure.save_path, run_figure.data_name, run_figure.data_human_readable_name,
+                   single_value=True)]
+
+
+def is_up_to_date(figure: Figure) -> bool:
+    if not os.path.exists(figure.save_path):
+        return False
+
+    return os.path.getmtime(figure.save_path) >= max(os.path.getmtime(path) for path in figure.inputs)
+
 
-        output_dir = os.path.join(OUT, data_name)
+def render_figure(figure: Figure):
+    datas = [read_csf_to_dict(path) for path in figure.inputs]
 
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+    os.makedirs(os.path.dirname(figure.save_path), exist_ok=True)
+    # Saved under a temporary name, so an interrupted render is not taken for an up-to-date figure
+    root, extension = os.path.splitext(figure.save_path)
+    tmp_path = f'{root}.{os.getpid()}.tmp{extension}'
 
-        output_path = os.path.join(output_dir, f'{scenario}.png')
+    if figure.single_value:
+        show_one_value_plot(datas[0], figure.data_name, figure.data_human_readable_name, tmp_path)
+    else:
+        generate_compare_plot(datas, figure.data_name, figure.data_human_readable_name, tmp_path)
 
-        generate_compare_plot(datas, data_name, data_human_readable_name, output_path)
+    os.replace(tmp_path, figure.save_path)
 
 
 def show_one_value_plot(data, data_name, data_human_readable_name, save_path=None):
@@ -58,8 +202,8 @@ def show_one_value_plot(data, data_name, data_human_readable_name, save_path=Non
     y_points_raw = data[data_name].tolist()
     y_points_smooth = smooth(data[data_name].tolist(), SMOOTHING_VALUE)
 
-    plt.plot(x_points, y_points_raw, color='#FF000022')
-    plt.plot(x_points, y_points_smooth, color='#FF0000FF')
+    plt.plot(*downsample(x_points, y_points_raw), color='#FF000022')
+    plt.plot(*downsample(x_points, y_points_smooth), color='#FF0000FF')
 
     plt.xlabel(data_human_readable_name)
     plt.ylabel("długość scenariusza")
@@ -72,6 +216,50 @@ def show_one_value_plot(data, data_name, data_human_readable_name, save_path=Non
     plt.close()
 
 
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets downsampling to n_out points, the first and the last point are kept.
+    From each bucket the point forming the largest triangle with the previous selected point and
+    the mean of the next bucket is selected, which keeps peaks of the curve.
+    """
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    bucket_sizes = np.diff(edges)
+    # Means of the next bucket, the last point for the last bucket
+    next_x = np.append((np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / bucket_sizes)[1:], x[-1])
+    next_y = np.append((np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / bucket_sizes)[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    last = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        areas = np.abs((x[last] - next_x[i]) * (y[start:end] - y[last])
+                       - (x[last] - x[start:end]) * (next_y[i] - y[last]))
+        last = start + int(np.argmax(areas))
+        selected[i + 1] = last
+
+    return x[selected], y[selected]
+
+
+def downsample(x_points, y_points) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Curve downsampled to max_plot_points, points with NaN values are dropped.
+    """
+    x_points = np.asarray(x_points, dtype=np.float64)
+    y_points = np.asarray(y_points, dtype=np.float64)
+    if max_plot_points is None:
+        return x_points, y_points
+
+    finite = np.isfinite(x_points) & np.isfinite(y_points)
+    return lttb(x_points[finite], y_points[finite], max_plot_points)
+
+
 def generate_compare_plot(datas, data_name, data_human_readable_name, save_path=None):
     colors = ['#0000FF', '#FF0000', '#00FF00']
     array_color = [(datas[i], colors[i]) for i in range(0, len(datas))]
@@ -82,8 +270,8 @@ def generate_compare_plot(datas, data_name, data_human_readable_name, save_path=
         y_points_raw = data[data_name].tolist()
         y_points_smooth = smooth(data[data_name].tolist(), SMOOTHING_VALUE)
 
-        plt.plot(x_points, y_points_raw, color=f'{color}22')
-        plt.plot(x_points, y_points_smooth, color=f'{color}FF')
+        plt.plot(*downsample(x_points, y_points_raw), color=f'{color}22')
+        plt.plot(*downsample(x_points, y_points_smooth), color=f'{color}FF')
 
         plt.xlabel("liczba kroków nauki")
         plt.ylabel(data_human_readable_name)
@@ -120,8 +308,8 @@ def show_roe_plot(data):
 
         color = colors_names[event_id]
 
-        plt.plot(x_points, y_points_raw, color=color, alpha=0.2)
-        plt.plot(x_points, y_points_smooth, color=color, alpha=1.0, label=event)
+        plt.plot(*downsample(x_points, y_points_raw), color=color, alpha=0.2)
+        plt.plot(*downsample(x_points, y_points_smooth), color=color, alpha=1.0, label=event)
 
     plt.xlabel("Liczba kroków nauki")
     plt.ylabel("Liczba wystąpień zdarzenia")
@@ -135,47 +323,63 @@ matplotlib.rcParams.update({'font.size': 16})
 matplotlib.rcParams.update({"figure.figsize":(6, 4)})
 matplotlib.rcParams.update({"savefig.bbox":'tight'})
 
-FILE_ONE = 'logs/final/baseline/sep_buffer/adv_action/mem_1/health_gathering/progress.csv'
-DIR_ONE = 'logs/final/baseline/sep_buffer/basic_action/mem_1'
-DIR_TWO = 'logs/final/ROE/sep_buffer/basic_action/mem_1'
-
-OUT = 'plots/baseline_vs_roe'
-matplotlib.use('qtAgg')
-
-# ROE vs Baselines
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoepisode_length", "długość epizodu")
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoextrinsic_reward", "zewnętrzna nagroda")
-
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoPICKUP_AMMO", "podniesienie amunicji")
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoPICKUP_HEALTH", "podniesienie apteczki")
-data = read_csf_to_dict('logs/final/ROE/sep_buffer/basic_action/mem_1/my_way_home/progress.csv')
-os.makedirs(os.path.join(OUT, 'my_way_home'))
-show_one_value_plot(data, 'emoMOVEMENT', 'zdarzenia poruszania się', os.path.join(OUT, 'my_way_home', 'roe_movement.png'))
-show_one_value_plot(data, 'emointrinsic_reward', 'nagroda wewnętrzna', os.path.join(OUT, 'my_way_home', 'roe_intristic.png'))
-
-# A2C vs PPO
-DIR_ONE = 'logs/final/PPO/sep_buffer/basic_action/mem_1'
-DIR_TWO = 'logs/final/ROE/sep_buffer/basic_action/mem_1'
-OUT = 'plots/a2c_vs_ppo'
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoepisode_length", "długość epizodu")
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoextrinsic_reward", "zewnętrzna nagroda")
-
-# Buffers
-DIR_ONE = 'logs/final/SAME_BUF/sep_buffer/adv_action/mem_1'
-DIR_TWO = 'logs/final/A2C_ADV/sep_buffer/adv_action/mem_1'
-OUT = 'plots/buffers'
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoextrinsic_reward", "zewnętrzna nagroda")
-
-# Action space
-DIR_ONE = 'logs/final/A2C_ADV/sep_buffer/adv_action/mem_1'
-DIR_TWO = 'logs/final/ROE/sep_buffer/basic_action/mem_1'
-OUT = 'plots/act_space'
-generate_compare_plots([DIR_ONE, DIR_TWO], "emoextrinsic_reward", "zewnętrzna nagroda")
-
-# MEM
-DIR_ONE = 'logs/final/A2C_ADV/sep_buffer/adv_action/mem_1'
-DIR_TWO = 'logs/final/MEM_TEST/sep_buffer/adv_action/mem_5'
-DIR_THREE = 'logs/final/MEM_TEST/sep_buffer/adv_action/mem_10'
-OUT = 'plots/mem'
-generate_compare_plots([DIR_ONE, DIR_TWO, DIR_THREE], "emoextrinsic_reward", "zewnętrzna nagroda")
-generate_compare_plots([DIR_ONE, DIR_TWO, DIR_THREE], "emoepisode_length", "długość epizodu")
+BASELINE = {'name': 'baseline', 'shared_buffer': False, 'advanced_actions': False, 'memory_size': 1}
+ROE = {'name': 'ROE', 'shared_buffer': False, 'advanced_actions': False, 'memory_size': 1}
+PPO = {'name': 'PPO', 'shared_buffer': False, 'advanced_actions': False, 'memory_size': 1}
+SAME_BUFFER = {'name': 'SAME_BUF', 'shared_buffer': False, 'advanced_actions': True, 'memory_size': 1}
+ADVANCED_ACTIONS = {'name': 'A2C_ADV', 'shared_buffer': False, 'advanced_actions': True, 'memory_size': 1}
+MEMORY_5 = {'name': 'MEM_TEST', 'shared_buffer': False, 'advanced_actions': True, 'memory_size': 5}
+MEMORY_10 = {'name': 'MEM_TEST', 'shared_buffer': False, 'advanced_actions': True, 'memory_size': 10}
+
+EPISODE_LENGTH = ("emoepisode_length", "długość epizodu")
+EXTRINSIC_REWARD = ("emoextrinsic_reward", "zewnętrzna nagroda")
+
+COMPARISONS = [
+    # ROE vs Baselines
+    Comparison('plots/baseline_vs_roe', [BASELINE, ROE], [
+        EPISODE_LENGTH,
+        EXTRINSIC_REWARD,
+        ("emoPICKUP_AMMO", "podniesienie amunicji"),
+        ("emoPICKUP_HEALTH", "podniesienie apteczki"),
+    ]),
+    # A2C vs PPO
+    Comparison('plots/a2c_vs_ppo', [PPO, ROE], [EPISODE_LENGTH, EXTRINSIC_REWARD]),
+    # Buffers
+    Comparison('plots/buffers', [SAME_BUFFER, ADVANCED_ACTIONS], [EXTRINSIC_REWARD]),
+    # Action space
+    Comparison('plots/act_space', [ADVANCED_ACTIONS, ROE], [EXTRINSIC_REWARD]),
+    # MEM
+    Comparison('plots/mem', [ADVANCED_ACTIONS, MEMORY_5, MEMORY_10], [EXTRINSIC_REWARD, EPISODE_LENGTH]),
+]
+
+RUN_FIGURES = [
+    RunFigure({**ROE, 'scenario': 'my_way_home'}, 'plots/baseline_vs_roe/my_way_home/roe_movement.png',
+              'emoMOVEMENT', 'zdarzenia poruszania się'),
+    RunFigure({**ROE, 'scenario': 'my_way_home'}, 'plots/baseline_vs_roe/my_way_home/roe_intristic.png',
+              'emointrinsic_reward', 'nagroda wewnętrzna'),
+]
+
+
+def main():
+    # Runs are selected from the run registry, run RunRegistry.py to index existing logs
+    registry = RunRegistry()
+
+    figures = []
+    for run_figure in RUN_FIGURES:
+        figures += get_run_figure(run_figure, registry)
+    for comparison in COMPARISONS:
+        figures += get_comparison_figures(comparison, registry)
+
+    outdated = [figure for figure in figures if force or not is_up_to_date(figure)]
+    print(f'{len(figures) - len(outdated)} figures up to date, rendering {len(outdated)}')
+    if not outdated:
+        return
+
+    max_workers = min(len(get_available_cpus()), len(outdated))
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context('spawn')) as executor:
+        for figure, _ in zip(outdated, executor.map(render_figure, outdated)):
+            print(figure.save_path)
+
+
+if __name__ == "__main__":
+    main()
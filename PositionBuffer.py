@@ -1,17 +1,19 @@
-import math
-
 import numpy as np
 
 
 class PositionBuffer:
     def __init__(self, buffer_size: int = 12800):
-        self.position_history: list[tuple[float, float]] = []
+        self.position_history = np.zeros((buffer_size, 2))
         self.buffer_size = buffer_size
+        self.idx = 0
+        self.size = 0
         self.min_position = [0, 0]
         self.max_position = [0, 0]
 
     def record_position(self, position: tuple[float, float]):
-        self.position_history.append(position)
+        self.position_history[self.idx] = position
+        self.idx = (self.idx + 1) % self.buffer_size
+        self.size = min(self.size + 1, self.buffer_size)
 
         self.min_position[0] = min(self.min_position[0], position[0])
         self.min_position[1] = min(self.min_position[1], position[1])
@@ -19,18 +21,21 @@ class PositionBuffer:
         self.max_position[0] = max(self.max_position[0], position[0])
         self.max_position[1] = max(self.max_position[1], position[1])
 
-        if len(self.position_history) > self.buffer_size:
-            self.position_history.pop(0)
-
     def get_position_heat_matrix(self, size: tuple[int, int]) -> np.ndarray:
-        position_matrix = np.zeros(size)
+        if self.size == 0:
+            return np.zeros(size)
+
+        positions = self.position_history[:self.size]
 
-        for i, position in enumerate(self.position_history):
-            scaled_x = math.floor((position[0] - self.min_position[0]) / (self.max_position[0] - self.min_position[0]) * (size[0] - 1))
-            scaled_y = math.floor((position[1] - self.min_position[1]) / (self.max_position[1] - self.min_position[1]) * (size[1] - 1))
+        min_position = np.array(self.min_position, dtype=np.float64)
+        position_range = np.array(self.max_position, dtype=np.float64) - min_position
+        # With no movement along an axis all positions are equal to min, so they fall into the first cell
+        position_range[position_range == 0] = 1
 
-            position_matrix[scaled_x, scaled_y] += 1
+        # Scaled positions are not negative, so truncation is floor
+        cells = ((positions - min_position) / position_range * (np.array(size) - 1)).astype(np.int64)
+        position_matrix = np.bincount(cells[:, 0] * size[1] + cells[:, 1], minlength=size[0] * size[1])
 
-        result = np.divide(position_matrix, len(self.position_history))
+        result = np.divide(position_matrix.reshape(size), self.size)
         result = np.clip(result, 0, 0.25)
         return result
@@ -1,9 +1,9 @@
 import math
 
 import numpy as np
-import vizdoom as vzd
 
 from enum import Enum
+from typing import NamedTuple, Optional
 
 from vizdoom import GameVariable
 
@@ -12,6 +12,34 @@ from PositionBuffer import PositionBuffer
 
 EVENTS_TYPES_NUMBER = 26
 
+# Game variables read by ROERewardShaping, in order of variables returned by _get_variables (without distance moved)
+ROE_GAME_VARIABLES = [
+    GameVariable.HEALTH,
+    GameVariable.ARMOR,
+    GameVariable.SELECTED_WEAPON_AMMO,
+    GameVariable.WEAPON0,
+    GameVariable.WEAPON1,
+    GameVariable.WEAPON2,
+    GameVariable.WEAPON3,
+    GameVariable.WEAPON4,
+    GameVariable.WEAPON5,
+    GameVariable.WEAPON6,
+    GameVariable.WEAPON7,
+    GameVariable.WEAPON8,
+    GameVariable.WEAPON9,
+    GameVariable.KILLCOUNT,
+    GameVariable.DEATHCOUNT,
+    GameVariable.SELECTED_WEAPON,
+    GameVariable.DAMAGECOUNT,
+    GameVariable.FRAGCOUNT,
+    GameVariable.POSITION_X,
+    GameVariable.POSITION_Y,
+]
+
+FRAGCOUNT_INDEX = ROE_GAME_VARIABLES.index(GameVariable.FRAGCOUNT)
+POSITION_X_INDEX = ROE_GAME_VARIABLES.index(GameVariable.POSITION_X)
+POSITION_Y_INDEX = ROE_GAME_VARIABLES.index(GameVariable.POSITION_Y)
+
 
 class VizdoomEvent(Enum):
     MOVEMENT = 0
@@ -27,14 +55,142 @@ class VizdoomEvent(Enum):
     DAMAGE_MONSTER = 25
 
 
+# Indices of variables returned by _get_variables, used by event definitions
+DISTANCE_MOVED = 0
+HEALTH = 1
+ARMOR = 2
+SELECTED_WEAPON_AMMO = 3
+WEAPON0 = 4
+KILL_COUNT = 14
+DEATH_COUNT = 15
+SELECTED_WEAPON = 16
+DAMAGE_COUNT = 17
+
+INCREASE = 1
+DECREASE = -1
+
+
+class EventDefinition(NamedTuple):
+    event: int
+    variable: int
+    direction: int
+    # Event fires only if this weapon is selected
+    selected_weapon: Optional[int] = None
+
+
+ROE_EVENT_DEFINITIONS = [
+    EventDefinition(0, DISTANCE_MOVED, INCREASE),  # 0. Movement
+    EventDefinition(1, HEALTH, INCREASE),  # 1. Health increase
+    EventDefinition(2, ARMOR, INCREASE),  # 2. Armor increase
+    EventDefinition(3, SELECTED_WEAPON_AMMO, DECREASE),  # 3. Ammo decrease
+    EventDefinition(4, SELECTED_WEAPON_AMMO, INCREASE),  # 4. Ammo increase
+    # 5-14. Weapon pickup 0-9
+    *[EventDefinition(5 + i, WEAPON0 + i, INCREASE) for i in range(10)],
+    # 15-24 Kill increase - for each weapon
+    *[EventDefinition(15 + i, KILL_COUNT, INCREASE, selected_weapon=i) for i in range(9)],
+    EventDefinition(25, DAMAGE_COUNT, INCREASE),  # 25. Damage
+]
+
+
+class EventTable:
+    """
+    Event definitions compiled into arrays, so all events are detected with a few NumPy operations.
+    """
+
+    def __init__(self, event_definitions: list[EventDefinition], events_number=EVENTS_TYPES_NUMBER):
+        self.events_number = events_number
+        self.events = np.array([definition.event for definition in event_definitions], dtype=np.int64)
+        self.variables = np.array([definition.variable for definition in event_definitions], dtype=np.int64)
+        self.directions = np.array([definition.direction for definition in event_definitions], dtype=np.float64)
+
+        # Row w says which definitions may fire while weapon w is selected, last row is for any other weapon
+        selected_weapons = [definition.selected_weapon for definition in event_definitions]
+        self.weapons_number = max([weapon + 1 for weapon in selected_weapons if weapon is not None], default=0)
+        self.weapon_masks = np.array([
+            [weapon is None or weapon == selected for weapon in selected_weapons]
+            for selected in range(self.weapons_number + 1)
+        ]).reshape(self.weapons_number + 1, len(event_definitions))
+
+        # Same rows as (event, variable, direction) lists for get_events, selected weapon values map to rows
+        self.weapon_rows = {float(weapon): weapon for weapon in range(self.weapons_number)}
+        self.weapon_definitions = [
+            [(definition.event, definition.variable, definition.direction)
+             for definition, is_allowed in zip(event_definitions, weapon_mask) if is_allowed]
+            for weapon_mask in self.weapon_masks
+        ]
+
+        # Maps fired definitions to event slots, used to detect events of many envs at once
+        self.event_matrix = np.zeros((len(event_definitions), events_number))
+        self.event_matrix[np.arange(len(event_definitions)), self.events] = 1
+
+    def get_events(self, current_vars: np.ndarray, last_vars: np.ndarray) -> np.ndarray:
+        """
+        Events of one env, a plain loop over the definitions of the selected weapon.
+        For a single env NumPy call overhead would outweigh the work.
+        """
+        current, last = current_vars.tolist(), last_vars.tolist()
+
+        weapon_row = self.weapon_rows.get(current[SELECTED_WEAPON], self.weapons_number)
+
+        events = np.zeros(self.events_number)
+        for event, variable, direction in self.weapon_definitions[weapon_row]:
+            if (current[variable] - last[variable]) * direction > 0:
+                events[event] = 1
+
+        return events
+
+    def get_events_batch(self, current_vars: np.ndarray, last_vars: np.ndarray) -> np.ndarray:
+        """
+        Events of many envs, variables have shape (n_envs, variables).
+        """
+        selected_weapons = current_vars[:, SELECTED_WEAPON]
+        weapon_rows = selected_weapons.astype(np.int64)
+        weapon_rows[(weapon_rows < 0) | (weapon_rows >= self.weapons_number)
+                    | (weapon_rows != selected_weapons)] = self.weapons_number
+
+        fired = np.sign(current_vars - last_vars)[:, self.variables] == self.directions
+        fired &= self.weapon_masks[weapon_rows]
+
+        return np.minimum(fired @ self.event_matrix, 1)
+
+
+def get_event_statistics(events_this_episode: np.ndarray) -> dict[str, float]:
+    result = {}
+
+    events_to_record = [
+        VizdoomEvent.MOVEMENT,
+        VizdoomEvent.PICKUP_HEALTH,
+        VizdoomEvent.PICKUP_ARMOUR,
+        VizdoomEvent.PICKUP_AMMO,
+        VizdoomEvent.DAMAGE_MONSTER,
+        # VizdoomEvent.KILL_MONSTER, # Calculated later using weapon events
+        VizdoomEvent.SHOOTING,
+    ]
+
+    for event_type in events_to_record:
+        result[event_type.name] = events_this_episode[event_type.value]
+
+    kill_count = 0
+
+    for enum_id in range(VizdoomEvent.KILL_MONSTER_WEAPON_START.value,
+                         VizdoomEvent.KILL_MONSTER_WEAPON_END.value + 1):
+        kill_count += events_this_episode[enum_id]
+
+    result["KILL_MONSTER"] = kill_count
+
+    return result
+
+
 class ROERewardShaping:
     def __init__(
             self,
             event_buffer_class,
             event_buffer_kwargs,
-            additional_reward_shaping_class=None
+            additional_reward_shaping_class=None,
+            event_definitions=None
     ) -> None:
         self.event_buffer = event_buffer_class(**event_buffer_kwargs)
+        self.event_table = EventTable(event_definitions or ROE_EVENT_DEFINITIONS)
 
         self.distance_moved_squared = 0
         self.intrinsic_reward = 0
@@ -45,6 +201,15 @@ class ROERewardShaping:
 
         self.position_buffer = PositionBuffer()
 
+        self.game_variable_indices = None
+
+    def set_available_game_variables(self, available_game_variables: list[GameVariable]):
+        """
+        Precompute where ROE game variables are in the GameState.game_variables vector.
+        """
+        indices = {variable: i for i, variable in enumerate(available_game_variables)}
+        self.game_variable_indices = np.array([indices[variable] for variable in ROE_GAME_VARIABLES])
+
     def get_reward(self, reward: float) -> float:
         intrinsic_reward_this_step = self.event_buffer.intrinsic_reward(self.events_this_step)
         self.intrinsic_reward += intrinsic_reward_this_step
@@ -58,14 +223,13 @@ class ROERewardShaping:
 
         return reward + intrinsic_reward_this_step + additional_reward
 
-    def step(self, doom_game: vzd.DoomGame):
-        self.events_this_step = self._get_events(doom_game)
+    def step(self, game_variables: np.ndarray):
+        roe_variables = game_variables[self.game_variable_indices]
+        self.events_this_step = self._get_events(roe_variables)
 
         self.events_this_episode += self.events_this_step
 
-        self.position_buffer.record_position((
-            doom_game.get_game_variable(GameVariable.POSITION_X),
-            doom_game.get_game_variable(GameVariable.POSITION_Y)))
+        self.position_buffer.record_position((roe_variables[POSITION_X_INDEX], roe_variables[POSITION_Y_INDEX]))
 
         return
 
@@ -84,12 +248,13 @@ class ROERewardShaping:
 
         return
 
-    def first_step(self, doom_game: vzd.DoomGame):
-        self.last_position_x = doom_game.get_game_variable(GameVariable.POSITION_X)
-        self.last_position_y = doom_game.get_game_variable(GameVariable.POSITION_Y)
+    def first_step(self, game_variables: np.ndarray):
+        roe_variables = game_variables[self.game_variable_indices]
+        self.last_position_x = roe_variables[POSITION_X_INDEX]
+        self.last_position_y = roe_variables[POSITION_Y_INDEX]
 
         self.events_this_step = np.zeros(EVENTS_TYPES_NUMBER)
-        self.current_vars = self._get_variables(doom_game)
+        self.current_vars = self._get_variables(roe_variables)
 
         self._reset_previous_state()
 
@@ -98,78 +263,28 @@ class ROERewardShaping:
     def _reset_previous_state(self):
         self.last_vars = self.current_vars
 
-    def _get_events(self, doom_game: vzd.DoomGame):
-        self.current_vars = self._get_variables(doom_game)
-
-        events = np.zeros(EVENTS_TYPES_NUMBER)
-
-        # If died -> no event
-        if self.current_vars[15] > self.last_vars[15]:
-            return events
-
-        # 0. Movement
-        if self.current_vars[0] > self.last_vars[0]:
-            events[0] = 1
-
-        # 1. Health increase
-        if self.current_vars[1] > self.last_vars[1]:
-            events[1] = 1
-
-        # 2. Armor increase
-        if self.current_vars[2] > self.last_vars[2]:
-            events[2] = 1
-
-        # 3. Ammo decrease
-        if self.current_vars[3] < self.last_vars[3]:
-            events[3] = 1
+    def _get_events(self, roe_variables: np.ndarray):
+        self.current_vars = self._get_variables(roe_variables)
 
-        # 4. Ammo increase
-        if self.current_vars[3] > self.last_vars[3]:
-            events[4] = 1
+        # If died -> no event, and previous state is not updated
+        if self.current_vars[DEATH_COUNT] > self.last_vars[DEATH_COUNT]:
+            return np.zeros(EVENTS_TYPES_NUMBER)
 
-        # 5-14. Weapon pickup 0-9
-        for i in range(4, 14):
-            if self.current_vars[i] > self.last_vars[i]:
-                events[i + 1] = 1
-
-        # 15-24 Kill increase - for each weapon
-        if self.current_vars[14] > self.last_vars[14]:
-            # events[15] = 1
-            for i in range(0, 9):
-                if self.current_vars[16] == i:  # If selected weapon
-                    events[15 + i] = 1
-
-        # 2
-        if self.current_vars[17] > self.last_vars[17]:
-            events[25] = 1
+        events = self.event_table.get_events(self.current_vars, self.last_vars)
 
         self._reset_previous_state()
 
         return events
 
-    def _get_variables(self, doom_game: vzd.DoomGame):
-        variables = [
-            self.get_distance_moved(doom_game),
-            doom_game.get_game_variable(GameVariable.HEALTH),
-            doom_game.get_game_variable(GameVariable.ARMOR),
-            doom_game.get_game_variable(GameVariable.SELECTED_WEAPON_AMMO),
-            doom_game.get_game_variable(GameVariable.WEAPON0),
-            doom_game.get_game_variable(GameVariable.WEAPON1),
-            doom_game.get_game_variable(GameVariable.WEAPON2),
-            doom_game.get_game_variable(GameVariable.WEAPON3),
-            doom_game.get_game_variable(GameVariable.WEAPON4),
-            doom_game.get_game_variable(GameVariable.WEAPON5),
-            doom_game.get_game_variable(GameVariable.WEAPON6),
-            doom_game.get_game_variable(GameVariable.WEAPON7),
-            doom_game.get_game_variable(GameVariable.WEAPON8),
-            doom_game.get_game_variable(GameVariable.WEAPON9),
-            doom_game.get_game_variable(GameVariable.KILLCOUNT) + doom_game.get_game_variable(GameVariable.FRAGCOUNT),
-            doom_game.get_game_variable(GameVariable.DEATHCOUNT),
-            doom_game.get_game_variable(GameVariable.SELECTED_WEAPON),
-            doom_game.get_game_variable(GameVariable.DAMAGECOUNT)
-        ]
+    def _get_variables(self, roe_variables: np.ndarray):
+        # [distance moved, HEALTH, ARMOR, SELECTED_WEAPON_AMMO, WEAPON0-9, KILLCOUNT + FRAGCOUNT, DEATHCOUNT,
+        #  SELECTED_WEAPON, DAMAGECOUNT]
+        variables = np.empty(FRAGCOUNT_INDEX + 1)
+        variables[0] = self.get_distance_moved(roe_variables[POSITION_X_INDEX], roe_variables[POSITION_Y_INDEX])
+        variables[1:] = roe_variables[:FRAGCOUNT_INDEX]
+        variables[14] += roe_variables[FRAGCOUNT_INDEX]
 
-        return np.array(variables)
+        return variables
 
     def get_statistics(self):
         result = {
@@ -177,33 +292,11 @@ class ROERewardShaping:
             "extrinsic_reward": self.extrinsic_reward
         }
 
-        events_to_record = [
-            VizdoomEvent.MOVEMENT,
-            VizdoomEvent.PICKUP_HEALTH,
-            VizdoomEvent.PICKUP_ARMOUR,
-            VizdoomEvent.PICKUP_AMMO,
-            VizdoomEvent.DAMAGE_MONSTER,
-            # VizdoomEvent.KILL_MONSTER, # Calculated later using weapon events
-            VizdoomEvent.SHOOTING,
-        ]
-
-        for event_type in events_to_record:
-            result[event_type.name] = self.events_this_episode[event_type.value]
-
-        kill_count = 0
-
-        for enum_id in range(VizdoomEvent.KILL_MONSTER_WEAPON_START.value,
-                             VizdoomEvent.KILL_MONSTER_WEAPON_END.value + 1):
-            kill_count += self.events_this_episode[enum_id]
-
-        result["KILL_MONSTER"] = kill_count
+        result.update(get_event_statistics(self.events_this_episode))
 
         return result
 
-    def get_distance_moved(self, doom_game: vzd.DoomGame):
-        position_x = doom_game.get_game_variable(GameVariable.POSITION_X)
-        position_y = doom_game.get_game_variable(GameVariable.POSITION_Y)
-
+    def get_distance_moved(self, position_x: float, position_y: float):
         delta_x = (position_x - self.last_position_x)
         delta_y = (position_y - self.last_position_y)
 
@@ -229,9 +322,11 @@ class StaticBufferROERewardShaping(ROERewardShaping):
             self,
             event_buffer_class,
             event_buffer_kwargs,
-            additional_reward_shaping_class=None
+            additional_reward_shaping_class=None,
+            event_definitions=None
     ):
-        ROERewardShaping.__init__(self, event_buffer_class, event_buffer_kwargs, additional_reward_shaping_class)
+        ROERewardShaping.__init__(self, event_buffer_class, event_buffer_kwargs, additional_reward_shaping_class,
+                                  event_definitions)
         if StaticBufferROERewardShaping.static_buffer is None:
             StaticBufferROERewardShaping.static_buffer = self.event_buffer
         else:
@@ -245,8 +340,8 @@ class BotsAdditionalRewardShaping:
         pass
 
     def get_reward(self, game_vars):
-        kill_count = game_vars[14]
-        death_count = game_vars[15]
+        kill_count = game_vars[KILL_COUNT]
+        death_count = game_vars[DEATH_COUNT]
 
         additional_reward = 0.
 
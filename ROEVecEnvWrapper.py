@@ -0,0 +1,189 @@
+from typing import Any, Dict, List
+
+import numpy as np
+from stable_baselines3.common.vec_env import VecEnv, VecEnvWrapper
+from stable_baselines3.common.vec_env.base_vec_env import VecEnvIndices
+
+from PositionBuffer import PositionBuffer
+from ROERewardShaping import EventTable, ROE_EVENT_DEFINITIONS, EVENTS_TYPES_NUMBER, ROE_GAME_VARIABLES, \
+    FRAGCOUNT_INDEX, POSITION_X_INDEX, POSITION_Y_INDEX, KILL_COUNT, DEATH_COUNT, get_event_statistics
+
+
+class ROEVecEnvWrapper(VecEnvWrapper):
+    """
+    ROE reward shaping of all envs computed in the learner process, in one batched NumPy pass per step.
+    All envs share a single event buffer, also when they run in separate processes.
+
+    Wrapped envs should be created without reward shaping (reward_shaping_class=None), game variables of each step
+    are read from VizDoomVecEnv shared memory or with get_attr for other vec envs.
+
+    :param venv: vectorized VizDoom envs
+    :param event_buffer_class: class of the shared event buffer
+    :param event_buffer_kwargs: kwargs of the shared event buffer
+    :param additional_reward_shaping_class: optional per env reward shaping based on ROE variables
+    :param event_definitions: ROE event definitions, ROE_EVENT_DEFINITIONS by default
+    """
+
+    def __init__(
+            self,
+            venv: VecEnv,
+            event_buffer_class,
+            event_buffer_kwargs,
+            additional_reward_shaping_class=None,
+            event_definitions=None
+    ):
+        super().__init__(venv)
+
+        self.event_buffer = event_buffer_class(**event_buffer_kwargs)
+        self.event_table = EventTable(event_definitions or ROE_EVENT_DEFINITIONS)
+
+        available_game_variables = self.venv.get_attr('available_game_variables', indices=[0])[0]
+        indices = {variable: i for i, variable in enumerate(available_game_variables)}
+        self.game_variable_indices = np.array([indices[variable] for variable in ROE_GAME_VARIABLES])
+
+        n = self.num_envs
+        self.current_vars = np.zeros((n, FRAGCOUNT_INDEX + 1))
+        self.last_vars = np.zeros((n, FRAGCOUNT_INDEX + 1))
+        self.last_positions = np.zeros((n, 2))
+        self.distance_moved_squared = np.zeros(n)
+        self.is_first_step = np.ones(n, dtype=bool)
+
+        self.events_this_episode = np.zeros((n, EVENTS_TYPES_NUMBER))
+        self.intrinsic_reward = np.zeros(n)
+        self.extrinsic_reward = np.zeros(n)
+
+        self.position_buffers = [PositionBuffer() for _ in range(n)]
+
+        self.additional_reward_shaping_class = additional_reward_shaping_class
+        self.additional_reward_shapings = [None] * n
+
+    def reset(self):
+        observations = self.venv.reset()
+
+        for env_idx in range(self.num_envs):
+            self._new_episode(env_idx)
+
+        return observations
+
+    def step_wait(self):
+        observations, rewards, dones, infos = self.venv.step_wait()
+        rewards = rewards.astype(np.float64)
+
+        game_variables, has_game_variables = self._get_game_variables()
+
+        # Reward shaping is applied only to steps with game state, like in ROERewardShaping
+        first = has_game_variables & self.is_first_step
+        regular = has_game_variables & ~self.is_first_step
+
+        roe_variables = game_variables[:, self.game_variable_indices]
+        positions = roe_variables[:, [POSITION_X_INDEX, POSITION_Y_INDEX]]
+        self.last_positions[first] = positions[first]
+
+        self.current_vars[has_game_variables] = self._get_variables(roe_variables, positions, has_game_variables)
+        self.last_vars[first] = self.current_vars[first]
+
+        # If died -> no event, and previous state is not updated
+        died = self.current_vars[:, DEATH_COUNT] > self.last_vars[:, DEATH_COUNT]
+        detect = regular & ~died
+
+        events_this_step = np.zeros((self.num_envs, EVENTS_TYPES_NUMBER))
+        events_this_step[detect] = self.event_table.get_events_batch(self.current_vars[detect], self.last_vars[detect])
+        self.last_vars[detect] = self.current_vars[detect]
+        self.events_this_episode += events_this_step
+
+        for env_idx in np.flatnonzero(regular):
+            self.position_buffers[env_idx].record_position(tuple(positions[env_idx]))
+
+        intrinsic_rewards = self.event_buffer.intrinsic_rewards(events_this_step) * has_game_variables
+        self.intrinsic_reward += intrinsic_rewards
+        self.extrinsic_reward += rewards * has_game_variables
+
+        additional_rewards = self._get_additional_rewards(has_game_variables)
+        self.extrinsic_reward += additional_rewards
+
+        rewards += intrinsic_rewards + additional_rewards
+        self.is_first_step[has_game_variables] = False
+
+        for env_idx in np.flatnonzero(dones):
+            if 'episode_statistics' in infos[env_idx]:
+                infos[env_idx]['episode_statistics'].update(self._get_episode_statistics(env_idx))
+
+            self.event_buffer.record_events(self.events_this_episode[env_idx])
+            self._new_episode(env_idx)
+
+        return observations, rewards, dones, infos
+
+    def _get_game_variables(self):
+        if hasattr(self.venv, 'get_game_variables'):
+            return self.venv.get_game_variables()
+
+        env_game_variables = self.venv.get_attr('game_variables')
+        has_game_variables = np.array([variables is not None for variables in env_game_variables])
+        game_variables = np.zeros((self.num_envs, len(self.venv.get_attr('available_game_variables', indices=[0])[0])))
+        for env_idx in np.flatnonzero(has_game_variables):
+            game_variables[env_idx] = env_game_variables[env_idx]
+
+        return game_variables, has_game_variables
+
+    def _get_variables(self, roe_variables, positions, mask):
+        # Same layout as ROERewardShaping._get_variables
+        delta = positions[mask] - self.last_positions[mask]
+        self.distance_moved_squared[mask] += np.sum(delta ** 2, axis=1)
+
+        variables = np.empty((np.count_nonzero(mask), FRAGCOUNT_INDEX + 1))
+        variables[:, 0] = np.sqrt(self.distance_moved_squared[mask])
+        variables[:, 1:] = roe_variables[mask, :FRAGCOUNT_INDEX]
+        variables[:, KILL_COUNT] += roe_variables[mask, FRAGCOUNT_INDEX]
+
+        return variables
+
+    def _get_additional_rewards(self, mask):
+        additional_rewards = np.zeros(self.num_envs)
+        if self.additional_reward_shaping_class is None:
+            return additional_rewards
+
+        for env_idx in np.flatnonzero(mask):
+            additional_rewards[env_idx] = self.additional_reward_shapings[env_idx].get_reward(
+                self.current_vars[env_idx])
+
+        return additional_rewards
+
+    def _new_episode(self, env_idx: int):
+        self.events_this_episode[env_idx] = 0
+        self.intrinsic_reward[env_idx] = 0
+        self.extrinsic_reward[env_idx] = 0
+        self.is_first_step[env_idx] = True
+
+        if self.additional_reward_shaping_class is not None:
+            self.additional_reward_shapings[env_idx] = self.additional_reward_shaping_class()
+
+    def get_statistics(self, indices: VecEnvIndices = None) -> List[Dict[str, float]]:
+        indices = list(self.venv._get_indices(indices))
+        env_statistics = self.venv.env_method('get_statistics', indices=indices)
+
+        for env_idx, statistics in zip(indices, env_statistics):
+            statistics.update(self._get_episode_statistics(env_idx))
+
+        return env_statistics
+
+    def _get_episode_statistics(self, env_idx: int) -> Dict[str, float]:
+        result = {
+            "intrinsic_reward": self.intrinsic_reward[env_idx],
+            "extrinsic_reward": self.extrinsic_reward[env_idx]
+        }
+        result.update(get_event_statistics(self.events_this_episode[env_idx]))
+
+        return result
+
+    def get_position_heat_matrix(self, size: tuple[int, int], indices: VecEnvIndices = None) -> List[np.ndarray]:
+        return [self.position_buffers[env_idx].get_position_heat_matrix(size)
+                for env_idx in self.venv._get_indices(indices)]
+
+    def env_method(self, method_name: str, *method_args, indices: VecEnvIndices = None, **method_kwargs) -> List[Any]:
+        # Reward shaping state lives in the wrapper, not in the envs
+        if method_name == 'get_statistics':
+            return self.get_statistics(indices)
+        if method_name == 'get_position_heat_matrix':
+            return self.get_position_heat_matrix(*method_args, indices=indices, **method_kwargs)
+
+        return self.venv.env_method(method_name, *method_args, indices=indices, **method_kwargs)
@@ -0,0 +1,276 @@
+import contextlib
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+REGISTRY_PATH = os.path.join(os.path.curdir, 'runs.sqlite')
+LOGS_DIR = os.path.join(os.path.curdir, 'logs')
+MODELS_DIR = os.path.join(os.path.curdir, 'model')
+
+# Run directories relative to LOGS_DIR and MODELS_DIR, as made by TrainingRun.get_path
+RUN_PATH_PATTERN = re.compile(r'^[^/]+/(?P<name>[^/]+)/(?P<buffer>sep_buffer|shared_buffer)'
+                              r'/(?P<actions>basic_action|adv_action)/mem_(?P<memory_size>\d+)/(?P<scenario>[^/]+)$')
+CHECKPOINT_PATTERN = re.compile(r'^best_model_(?P<step>\d+)\.zip$')
+STEP_METRIC = 'time/total_timesteps'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    shared_buffer INTEGER NOT NULL,
+    advanced_actions INTEGER NOT NULL,
+    memory_size INTEGER NOT NULL,
+    config TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_scenario ON runs (scenario, name, memory_size);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    step INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    metric REAL,
+    PRIMARY KEY (run_id, step)
+);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    step INTEGER,
+    PRIMARY KEY (run_id, name)
+);
+"""
+
+
+class Run(NamedTuple):
+    id: int
+    path: str
+    name: str
+    scenario: str
+    shared_buffer: bool
+    advanced_actions: bool
+    memory_size: int
+    # Training configuration, None for runs only found by scan
+    config: Optional[Dict[str, Any]]
+
+    def get_log_dir(self) -> str:
+        return os.path.join(LOGS_DIR, self.path)
+
+    def get_model_dir(self) -> str:
+        return os.path.join(MODELS_DIR, self.path)
+
+
+def parse_run_path(path: str) -> Optional[Dict[str, Any]]:
+    match = RUN_PATH_PATTERN.match(path.replace(os.sep, '/'))
+    if match is None:
+        return None
+
+    return {
+        'name': match['name'],
+        'scenario': match['scenario'],
+        'shared_buffer': match['buffer'] == 'shared_buffer',
+        'advanced_actions': match['actions'] == 'adv_action',
+        'memory_size': int(match['memory_size']),
+    }
+
+
+def read_summary_metrics(progress_path: str) -> Dict[str, float]:
+    """
+    Last logged value of every metric in a progress.csv.
+    """
+    metrics = {}
+    with open(progress_path, newline='') as f:
+        for row in csv.DictReader(f):
+            for name, value in row.items():
+                if value:
+                    metrics[name] = value
+
+    return {name: float(value) for name, value in metrics.items()}
+
+
+class RunRegistry:
+    """
+    SQLite index of training runs, their checkpoints and summary metrics.
+    Runs are registered by training and by scan(), which indexes runs already in LOGS_DIR and MODELS_DIR.
+    Every call uses its own connection, so the registry can be used from any thread or process.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """
+        Connection committed and closed on exit.
+        """
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            connection.execute('PRAGMA foreign_keys = ON')
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def register_run(self, path: str, config: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Adds or updates the run with the given TrainingRun.get_path() path, returns its id.
+        """
+        with self._connect() as connection:
+            return self._register_run(connection, path, config)
+
+    def _register_run(self, connection: sqlite3.Connection, path: str, config: Optional[Dict[str, Any]]) -> int:
+        path = path.replace(os.sep, '/')
+        identity = parse_run_path(path)
+        if identity is None:
+            raise ValueError(f'Not a run path: {path}')
+
+        config_json = None if config is None else json.dumps(config, default=lambda value: getattr(
+            value, '__name__', repr(value)))
+        connection.execute("""
+            INSERT INTO runs (path, name, scenario, shared_buffer, advanced_actions, memory_size, config, updated)
+            VALUES (:path, :name, :scenario, :shared_buffer, :advanced_actions, :memory_size, :config, :updated)
+            ON CONFLICT (path) DO UPDATE SET config = COALESCE(excluded.config, config), updated = excluded.updated
+        """, {**identity, 'path': path, 'config': config_json, 'updated': time.time()})
+
+        return connection.execute('SELECT id FROM runs WHERE path = ?', (path,)).fetchone()[0]
+
+    def update_checkpoints(self, run_path: str, saved: List[tuple], removed: List[tuple]):
+        """
+        Records saved and removed checkpoints, given as (path, step, metric) tuples like Checkpointer.Checkpoint.
+        """
+        with self._connect() as connection:
+            run_id = self._register_run(connection, run_path, None)
+            connection.executemany('DELETE FROM checkpoints WHERE run_id = ? AND step = ?',
+                                   [(run_id, step) for _, step, _ in removed])
+            connection.executemany("""
+                INSERT OR REPLACE INTO checkpoints (run_id, step, path, metric) VALUES (?, ?, ?, ?)
+            """, [(run_id, step, path, metric) for path, step, metric in saved])
+
+    def set_metrics(self, run_path: str, metrics: Dict[str, float], step: Optional[int] = None):
+        with self._connect() as connection:
+            run_id = self._register_run(connection, run_path, None)
+            self._set_metrics(connection, run_id, metrics, step)
+
+    @staticmethod
+    def _set_metrics(connection: sqlite3.Connection, run_id: int, metrics: Dict[str, float], step: Optional[int]):
+        connection.executemany('INSERT OR REPLACE INTO metrics (run_id, name, value, step) VALUES (?, ?, ?, ?)',
+                               [(run_id, name, value, step) for name, value in metrics.items()])
+
+    def scan(self, logs_dir: str = LOGS_DIR, models_dir: str = MODELS_DIR):
+        """
+        Indexes run directories, checkpoints on disk replace the recorded ones and metrics are read from progress.csv.
+        """
+        run_paths = set()
+        for root_dir in (logs_dir, models_dir):
+            for dir_path, _, _ in os.walk(root_dir):
+                run_path = os.path.relpath(dir_path, root_dir)
+                if parse_run_path(run_path) is not None:
+                    run_paths.add(run_path)
+
+        with self._connect() as connection:
+            for run_path in sorted(run_paths):
+                run_id = self._register_run(connection, run_path, None)
+
+                model_dir = os.path.join(models_dir, run_path)
+                checkpoints = []
+                if os.path.isdir(model_dir):
+                    for file_name in os.listdir(model_dir):
+                        match = CHECKPOINT_PATTERN.match(file_name)
+                        if match is not None:
+                            checkpoints.append((run_id, int(match['step']), os.path.join(model_dir, file_name)))
+
+                # Metrics of checkpoints saved by training are kept
+                connection.execute(f"""
+                    DELETE FROM checkpoints WHERE run_id = ? AND step NOT IN ({','.join('?' * len(checkpoints))})
+                """, [run_id] + [step for _, step, _ in checkpoints])
+                connection.executemany("""
+                    INSERT INTO checkpoints (run_id, step, path) VALUES (?, ?, ?)
+                    ON CONFLICT (run_id, step) DO UPDATE SET path = excluded.path
+                """, checkpoints)
+
+                progress_path = os.path.join(logs_dir, run_path, 'progress.csv')
+                if os.path.exists(progress_path):
+                    metrics = read_summary_metrics(progress_path)
+                    step = metrics.get(STEP_METRIC)
+                    self._set_metrics(connection, run_id, metrics, None if step is None else int(step))
+
+    def find_runs(self, **selection) -> List[Run]:
+        """
+        Runs with the given values of Run fields, like find_runs(scenario='deathmatch', memory_size=10).
+        """
+        unknown = set(selection) - set(Run._fields)
+        if unknown:
+            raise ValueError(f'Unknown run fields: {unknown}')
+
+        where = ' AND '.join(f'{field} = :{field}' for field in selection) or '1'
+        with self._connect() as connection:
+            rows = connection.execute(f"""
+                SELECT id, path, name, scenario, shared_buffer, advanced_actions, memory_size, config FROM runs
+                WHERE {where} ORDER BY path
+            """, selection).fetchall()
+
+        return [Run(run_id, path, name, scenario, bool(shared_buffer), bool(advanced_actions), memory_size,
+                    None if config is None else json.loads(config))
+                for run_id, path, name, scenario, shared_buffer, advanced_actions, memory_size, config in rows]
+
+    def find_run(self, **selection) -> Optional[Run]:
+        """
+        The only run matching the selection, None if there is none.
+        """
+        runs = self.find_runs(**selection)
+        if len(runs) > 1:
+            raise ValueError(f'{len(runs)} runs match {selection}: {[run.path for run in runs]}')
+
+        return runs[0] if runs else None
+
+    def get_checkpoint(self, run: Run, step: Optional[int] = None) -> Optional[str]:
+        """
+        Path of the checkpoint saved at step, the latest one by default.
+        """
+        with self._connect() as connection:
+            if step is None:
+                row = connection.execute('SELECT path FROM checkpoints WHERE run_id = ? ORDER BY step DESC LIMIT 1',
+                                         (run.id,)).fetchone()
+            else:
+                row = connection.execute('SELECT path FROM checkpoints WHERE run_id = ? AND step = ?',
+                                         (run.id, step)).fetchone()
+
+        return None if row is None else row[0]
+
+    def get_latest_checkpoint(self, **selection) -> Optional[str]:
+        """
+        Latest checkpoint of the only run matching the selection.
+        """
+        run = self.find_run(**selection)
+        return None if run is None else self.get_checkpoint(run)
+
+    def get_metrics(self, run: Run) -> Dict[str, float]:
+        with self._connect() as connection:
+            return dict(connection.execute('SELECT name, value FROM metrics WHERE run_id = ?', (run.id,)))
+
+
+def main():
+    registry = RunRegistry()
+
+    start = time.time()
+    registry.scan()
+    runs = registry.find_runs()
+    print(f'Indexed {len(runs)} runs in {time.time() - start:.2f}s')
+
+    for run in runs:
+        print(f'{run.path}: {registry.get_checkpoint(run)}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import functools
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# Histogram bins are log spaced, 4 per doubling of duration in nanoseconds
+BINS_PER_OCTAVE = 4
+# Durations up to 2**40 ns
+OCTAVES = 40
+BINS = (OCTAVES + 1) * BINS_PER_OCTAVE
+PERCENTILES = [50, 90, 99]
+
+
+def _bin_edges() -> Tuple[np.ndarray, np.ndarray]:
+    bins = np.arange(BINS)
+    bits, sub = np.divmod(bins, BINS_PER_OCTAVE)
+    return np.ldexp(BINS_PER_OCTAVE + sub, bits - 3), np.ldexp(BINS_PER_OCTAVE + sub + 1, bits - 3)
+
+
+class StepTimers:
+    """
+    Duration histograms of env stages, functions are timed by replacing them with wrap().
+    Statistics are computed over windows of statistics_interval timed calls.
+    """
+
+    def __init__(self, stages: List[str], statistics_interval: int = 4096):
+        self.stages = stages
+        self.statistics_interval = statistics_interval
+
+        self.histograms = [[0] * BINS for _ in stages]
+        self.totals = [0] * len(stages)
+        self.counts = [0] * len(stages)
+        self.records = 0
+
+        lower, upper = _bin_edges()
+        self.bin_centers_us = np.sqrt(lower * upper) / 1000
+        self.statistics = self._compute_statistics()
+
+    def record(self, stage_idx: int, elapsed_ns: int):
+        # Top 3 bits of the duration select the bin, durations under 8 ns share the first bin
+        elapsed_ns = min(max(elapsed_ns, 8), 2 ** OCTAVES - 1)
+        bits = elapsed_ns.bit_length()
+        self.histograms[stage_idx][bits * BINS_PER_OCTAVE + ((elapsed_ns >> (bits - 3)) & 3)] += 1
+        self.totals[stage_idx] += elapsed_ns
+        self.counts[stage_idx] += 1
+
+        self.records += 1
+        if self.records >= self.statistics_interval:
+            self.statistics = self._compute_statistics()
+            self.clear()
+
+    def wrap(self, stage: str, function: Callable) -> Callable:
+        stage_idx = self.stages.index(stage)
+        record = self.record
+        perf_counter_ns = time.perf_counter_ns
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            result = function(*args, **kwargs)
+            record(stage_idx, perf_counter_ns() - start)
+            return result
+
+        return timed
+
+    def clear(self):
+        for histogram in self.histograms:
+            histogram[:] = [0] * len(histogram)
+        self.totals = [0] * len(self.stages)
+        self.counts = [0] * len(self.stages)
+        self.records = 0
+
+    def get_statistics(self) -> Dict[str, float]:
+        """
+        Mean and percentiles of stage durations in microseconds, from the last full window.
+        """
+        return self.statistics
+
+    def _compute_statistics(self) -> Dict[str, float]:
+        result = {}
+
+        for stage, histogram, total, count in zip(self.stages, self.histograms, self.totals, self.counts):
+            result[f'step_time/{stage}_mean_us'] = total / count / 1000 if count else 0.
+            cumulative = np.cumsum(histogram)
+            for percentile in PERCENTILES:
+                bin_idx = np.searchsorted(cumulative, percentile / 100 * count)
+                result[f'step_time/{stage}_p{percentile}_us'] = float(self.bin_centers_us[bin_idx]) if count else 0.
+
+        return result
@@ -9,8 +9,6 @@ from rich.progress import track
 
 from stable_baselines3 import PPO, A2C
 
-from TrainModel import scenario, memory_size
-
 from ROERewardShaping import ROERewardShaping, EVENTS_TYPES_NUMBER, BotsAdditionalRewardShaping
 
 scenario = 'deathmatch'
@@ -22,10 +20,13 @@ def main():
 
     env = VizDoomEnv(
         scenario,
+        frame_skip=1,
         is_window_visible=True,
         doom_skill=3,
         memory_size=10,
         advanced_actions=True,
+        native_resolution=False,
+        decision_interval=4,
 
         reward_shaping_class=ROERewardShaping,
         reward_shaping_kwargs={
@@ -33,25 +34,20 @@ def main():
             'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER}
         }
     )
-    env.frame_skip = 1
 
     episode_results = []
 
     for episode in range(100):
         obs, _ = env.reset()
-        action, _ = model.predict(obs)
 
         terminated = False
 
-        step = 0
         while not terminated:
-            if step % 4 == 0:
-                action, _ = model.predict(obs)
+            action, _ = model.predict(obs)
 
             obs, reward, terminated, _, info = env.step(action)
 
-            step += 1
-            time.sleep(1 / (30. * 2))
+            time.sleep(env.decision_interval / (30. * 2))
 
     env.close()
 
@@ -1,67 +1,131 @@
 import csv
+import functools
 import os
-from copy import copy
-from typing import Dict
+from typing import Dict, Optional
 
 import matplotlib.pyplot as plt
 import numpy as np
 import tensorboard as tf
 
 from stable_baselines3.common.callbacks import BaseCallback
-from stable_baselines3.common.logger import Figure
+from stable_baselines3.common.logger import TensorBoardOutputFormat
 
+from BackgroundWriter import BackgroundWriter
+from Checkpointer import Checkpointer, RetentionPolicy
+from RunRegistry import RunRegistry
 from VizDoomEnv import VizDoomEnv
 
 
+def plot_heatmap(data: np.ndarray) -> plt.Figure:
+    """
+    Heatmap figure, also used to re-render heatmaps saved in npz files.
+    """
+    figure = plt.Figure()
+    figure.add_subplot().imshow(data, cmap='hot', interpolation='nearest')
+    return figure
+
+
 class TrainAndLoggingCallback(BaseCallback):
-    def __init__(self, check_freq, save_path, verbose=1):
+    """
+    Logs episode statistics, position heatmaps and keeps checkpoints of the best models.
+    Heatmaps, checkpoints and registry updates are written in background threads. Scalar statistics are only
+    buffered by the SB3 logger, its csv and TensorBoard dumps still run in the training loop.
+    """
+
+    def __init__(self, check_freq, save_path, verbose=1, retention_policy=RetentionPolicy(),
+                 registry: Optional[RunRegistry] = None, run_path: Optional[str] = None):
         super(TrainAndLoggingCallback, self).__init__(verbose)
         self.check_freq = check_freq
         self.save_path = save_path
+        self.retention_policy = retention_policy
+        # Checkpoints and summary metrics are recorded in the registry under run_path
+        self.registry = registry
+        self.run_path = run_path
 
         csv_log_path = os.path.join(save_path, 'logs.csv')
 
+        # Sums of logged statistics of episodes finished since the last checkpoint
+        self.statistics_sum = {}
+        self.episodes = 0
+        # Means of logged statistics over the episodes before the last checkpoint, used to keep the best checkpoints
+        self.last_statistics = {}
+
     def _init_callback(self):
         if self.save_path is not None:
             os.makedirs(self.save_path, exist_ok=True)
 
+        on_change = None
+        if self.registry is not None:
+            on_change = functools.partial(self.registry.update_checkpoints, self.run_path)
+        self.checkpointer = Checkpointer(self.save_path, self.retention_policy, on_change)
+        # Metrics are never dropped, unlike figures, there is at most one update per checkpoint
+        self.registry_writer = BackgroundWriter(drop_on_full=False) if self.registry is not None else None
+
+        # Figures are rendered and written in the background, so logging does not stall the rollout
+        self.writer = BackgroundWriter()
+        self.tensorboard_writer = next((output_format.writer for output_format in self.logger.output_formats
+                                        if isinstance(output_format, TensorBoardOutputFormat)), None)
+        self.heatmap_dir = None
+        if self.logger.get_dir() is not None:
+            self.heatmap_dir = os.path.join(self.logger.get_dir(), 'heatmaps')
+
     def _on_step(self):
         if self.n_calls % self.check_freq == 0:
-            model_path = os.path.join(self.save_path, f"best_model_{self.n_calls}")
-            self.model.save(model_path)
+            self._update_last_statistics()
+            metric = self.last_statistics.get(self.retention_policy.best_metric)
+            self.checkpointer.save(self.model, self.n_calls, metric)
 
-        statistics = self._get_average_statistics()
+            if self.registry is not None:
+                self.registry_writer.submit(self.registry.set_metrics, self.run_path, self.last_statistics,
+                                            self.num_timesteps)
 
-        for name, value in statistics.items():
-            self.logger.record(f"emo/{name}", value)
+        for info in self.locals['infos']:
+            if 'episode_statistics' in info:
+                self._add_episode_statistics(info['episode_statistics'])
 
         self._log_heatmap()
 
         return True
 
-    def _on_rollout_end(self) -> None:
-        pass
+    def _update_last_statistics(self):
+        # Without finished episodes since the last checkpoint, the previous means are kept
+        if self.episodes == 0:
+            return
+
+        self.last_statistics = {name: value / self.episodes for name, value in self.statistics_sum.items()}
+        self.statistics_sum = {}
+        self.episodes = 0
+
+    def _on_training_end(self) -> None:
+        self.checkpointer.close()
+        self.writer.close()
+        if self.registry_writer is not None:
+            self.registry_writer.close()
+        if self.tensorboard_writer is not None:
+            self.tensorboard_writer.flush()
 
     def _log_heatmap(self):
         if self.num_timesteps % 12800 == 0 and self.num_timesteps != 0:
-            figure = plt.Figure()
+            heatmaps = np.stack(self.training_env.env_method('get_position_heat_matrix', (64, 64)))
+            self.writer.submit(self._write_heatmap, heatmaps, self.num_timesteps)
 
-            vec_datas = self.training_env.env_method('get_position_heat_matrix', (64, 64))
-            data = sum(vec_datas) / len(vec_datas)
+    def _write_heatmap(self, heatmaps: np.ndarray, timesteps: int):
+        data = heatmaps.mean(axis=0)
 
-            figure.add_subplot().imshow(data, cmap='hot', interpolation='nearest')
-            self.logger.record("position/heatmap", Figure(figure, close=True), exclude=("stdout", "log", "json", "csv"))
-            plt.close()
+        if self.heatmap_dir is not None:
+            os.makedirs(self.heatmap_dir, exist_ok=True)
+            np.savez_compressed(os.path.join(self.heatmap_dir, f'heatmap_{timesteps}.npz'),
+                                heatmap=data, env_heatmaps=heatmaps, timesteps=timesteps)
 
-    def _get_average_statistics(self) -> Dict[str, float]:
-        vec_stats = self.training_env.env_method('get_statistics')
-        result = copy(vec_stats[0])
+        if self.tensorboard_writer is not None:
+            self.tensorboard_writer.add_figure("position/heatmap", plot_heatmap(data), timesteps, close=True)
 
-        for stats in vec_stats[1:]:
-            for name, value in stats.items():
-                result[name] += value
-
-        for name, value in result.items():
-            result[name] /= len(vec_stats)
+    def _add_episode_statistics(self, statistics: Dict[str, float]):
+        for name, value in statistics.items():
+            # Statistics with their own namespace, like step_time/, are logged as they are
+            logged_name = name if '/' in name else f"emo/{name}"
+            # Averaged over all episodes finished since the last dump of the logger
+            self.logger.record_mean(logged_name, value)
+            self.statistics_sum[logged_name] = self.statistics_sum.get(logged_name, 0) + value
 
-        return result
+        self.episodes += 1
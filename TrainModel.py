@@ -1,120 +1,166 @@
 import os.path
+from typing import List, NamedTuple, Optional
 
+import torch
 from wakepy import keep
 
 from EventBuffer import EventBuffer
 
+from Checkpointer import RetentionPolicy
 from TrainAndLoggingCallback import TrainAndLoggingCallback
 
 from stable_baselines3 import PPO, A2C
-from stable_baselines3.common.env_util import make_vec_env
 
+from RunRegistry import RunRegistry
+from TrainScheduler import run_jobs
 from VizDoomBotsEnv import VizDoomBotsEnv
 from VizDoomEnv import VizDoomEnv
+from VizDoomVecEnv import make_vizdoom_vec_env
+from ROEVecEnvWrapper import ROEVecEnvWrapper
 
 from ROERewardShaping import ROERewardShaping, SimpleRewardShaping, EVENTS_TYPES_NUMBER, BotsAdditionalRewardShaping, \
     StaticBufferROERewardShaping
 
 from stable_baselines3.common.logger import configure
 
-scenario = "simple_deathmatch"
-frame_skip = 4
-memory_size = 1
-advanced_actions = False
+ROE_KWARGS = {
+    'event_buffer_class': EventBuffer,
+    'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER},
+    'additional_reward_shaping_class': None
+}
+
+# Reward shapings, which ROEVecEnvWrapper computes with one event buffer for all envs when shared_buffer is set
+SHARED_BUFFER_REWARD_SHAPINGS = (ROERewardShaping, StaticBufferROERewardShaping)
+
+
+class TrainingRun(NamedTuple):
+    scenario: str
+    reward_shaping_class: Optional[type] = SimpleRewardShaping
+    reward_shaping_kwargs: Optional[dict] = ROE_KWARGS
+    name: str = 'baseline'
+    frame_skip: int = 4
+    memory_size: int = 1
+    advanced_actions: bool = False
+    # ROE with one event buffer shared by all envs, computed in the learner process
+    shared_buffer: bool = False
+    n_envs: int = 4
+    doom_skill: int = 4
+    total_timesteps: int = 10_000_000
+    learner_threads: int = 1
+    retention_policy: RetentionPolicy = RetentionPolicy()
+
+    def get_path(self) -> str:
+        advanced_actions_str = 'adv_action' if self.advanced_actions else 'basic_action'
+        buffer_str = 'shared_buffer' if self.shared_buffer else 'sep_buffer'
+
+        return os.path.join("final", self.name, buffer_str, advanced_actions_str, f"mem_{self.memory_size}",
+                            self.scenario)
+
+    def get_required_cpus(self) -> int:
+        return self.n_envs + self.learner_threads
+
+
+THESIS_SCENARIOS = ['health_gathering', 'health_gathering_supreme', 'my_way_home', 'deadly_corridor',
+                    'simple_deathmatch', 'deathmatch']
+
+TRAINING_RUNS = [
+    TrainingRun(scenario, n_envs=16 if scenario == 'deathmatch' else 4)
+    for scenario in THESIS_SCENARIOS
+]
+
+
+def train(run: TrainingRun, cpus: Optional[List[int]] = None):
+    if run.shared_buffer and run.reward_shaping_class not in SHARED_BUFFER_REWARD_SHAPINGS:
+        raise ValueError(f'shared_buffer is only supported with ROE reward shaping, not {run.reward_shaping_class}')
+
+    LOG_DIR = os.path.join(os.path.curdir, 'logs', run.get_path())
+    CHECKPOINT_DIR = os.path.join(os.path.curdir, "model", run.get_path())
+
+    # Learner threads and env processes get disjoint CPUs, envs share all CPUs if there are not enough of them
+    worker_cpus = None
+    if cpus:
+        learner_cpus = cpus[:run.learner_threads]
+        env_cpus = cpus[run.learner_threads:] or cpus
+        worker_cpus = [[cpu] for cpu in env_cpus]
+
+        os.sched_setaffinity(0, learner_cpus)
+        torch.set_num_threads(len(learner_cpus))
+
+    env = make_vizdoom_vec_env(
+        VizDoomEnv,
+        n_envs=run.n_envs,
+        env_kwargs={
+            "scenario": run.scenario,
+            "is_window_visible": False,
+            "frame_skip": run.frame_skip,
+            "doom_skill": run.doom_skill,
+            "memory_size": run.memory_size,
+            "advanced_actions": run.advanced_actions,
+
+            'reward_shaping_class': None if run.shared_buffer else run.reward_shaping_class,
+            'reward_shaping_kwargs': None if run.shared_buffer else run.reward_shaping_kwargs,
+        },
+        worker_cpus=worker_cpus
+    )
+
+    if run.shared_buffer:
+        env = ROEVecEnvWrapper(env, **run.reward_shaping_kwargs)
+
+    registry = RunRegistry()
+    registry.register_run(run.get_path(), {**run._asdict(), 'retention_policy': run.retention_policy._asdict()})
+
+    callback = TrainAndLoggingCallback(
+        check_freq=100000, save_path=CHECKPOINT_DIR, retention_policy=run.retention_policy,
+        registry=registry, run_path=run.get_path()
+    )
+
+    # A2C
+    model = A2C(
+        "CnnPolicy",
+        env,
+        # tensorboard_log=LOG_DIR,
+        verbose=1,
+        learning_rate=7e-4,
+        n_steps=32,
+        gamma=0.99,
+        ent_coef=0.01,
+        vf_coef=0.5,
+        max_grad_norm=0.5,
+        use_rms_prop=True,
+        rms_prop_eps=1e-5
+    )
+
+    # model = PPO(
+    #     "CnnPolicy",
+    #     env,
+    #     tensorboard_log=LOG_DIR,
+    #     verbose=1,
+    #     learning_rate=7e-4,
+    #     n_steps=4096,
+    #     gae_lambda=0.95,
+    #     clip_range=0.1,
+    #     batch_size=64,
+    # )
+
+    train_logger = configure(LOG_DIR, ["stdout", "csv", "tensorboard"])
+    model.set_logger(train_logger)
+
+    model.learn(total_timesteps=run.total_timesteps, callback=callback)
+
+    env.close()
 
 
-if advanced_actions:
-    advanced_actions_str = 'adv_action'
-else:
-    advanced_actions_str = 'basic_action'
-
-buffer_str = 'sep_buffer'
+def main():
+    log_paths = [os.path.join(os.path.curdir, 'logs', run.get_path(), 'stdout.txt') for run in TRAINING_RUNS]
 
-static_additional_reward = 0.
+    with keep.running() as m:
+        if not m.success:
+            print("Cannot prevent sleep")
 
+        exit_codes = run_jobs(train, TRAINING_RUNS, [run.get_required_cpus() for run in TRAINING_RUNS], log_paths)
 
-def main():
-    # scenarios_to_learn = ['health_gathering', 'health_gathering_supreme', 'my_way_home', 'deadly_corridor']
-    # scenarios_to_learn = ['simple_deathmatch', 'deathmatch']
-    scenarios_to_learn = ['simple_deathmatch']
-
-    for scenario_name in scenarios_to_learn:
-    # if True:
-    #     scenario_name =
-        PATH = os.path.join("final", 'baseline', buffer_str,
-                            f"{advanced_actions_str}", f"mem_{memory_size}",
-                            scenario_name)
-
-        LOG_DIR = os.path.join(os.path.curdir, 'logs', PATH)
-        CHECKPOINT_DIR = os.path.join(os.path.curdir, "model", PATH)
-
-        n_envs = 4
-        if scenario_name == 'deathmatch':
-            n_envs = 16
-
-        env = make_vec_env(
-            VizDoomEnv,
-            n_envs=n_envs,
-            env_kwargs={
-                "scenario": scenario_name,
-                "is_window_visible": False,
-                "frame_skip": frame_skip,
-                "doom_skill": 4,
-                "memory_size": memory_size,
-                "advanced_actions": advanced_actions,
-
-                'reward_shaping_class': SimpleRewardShaping,
-                'reward_shaping_kwargs': {
-                    'event_buffer_class': EventBuffer,
-                    'event_buffer_kwargs': {'n': EVENTS_TYPES_NUMBER},
-                    'additional_reward_shaping_class': None
-                },
-            },
-
-        )
-
-        callback = TrainAndLoggingCallback(
-            check_freq=100000, save_path=CHECKPOINT_DIR
-        )
-
-        # A2C
-        model = A2C(
-            "CnnPolicy",
-            env,
-            # tensorboard_log=LOG_DIR,
-            verbose=1,
-            learning_rate=7e-4,
-            n_steps=32,
-            gamma=0.99,
-            ent_coef=0.01,
-            vf_coef=0.5,
-            max_grad_norm=0.5,
-            use_rms_prop=True,
-            rms_prop_eps=1e-5
-        )
-
-        # model = PPO(
-        #     "CnnPolicy",
-        #     env,
-        #     tensorboard_log=LOG_DIR,
-        #     verbose=1,
-        #     learning_rate=7e-4,
-        #     n_steps=4096,
-        #     gae_lambda=0.95,
-        #     clip_range=0.1,
-        #     batch_size=64,
-        # )
-
-        train_logger = configure(LOG_DIR, ["stdout", "csv", "tensorboard"])
-        model.set_logger(train_logger)
-
-        with keep.running() as m:
-            if not m.success:
-                print("Cannot prevent sleep")
-
-            model.learn(total_timesteps=1e7, callback=callback)
-
-        env.close()
+    for run, exit_code in zip(TRAINING_RUNS, exit_codes):
+        print(f'{run.get_path()}: exit code {exit_code}')
 
 
 if __name__ == "__main__":
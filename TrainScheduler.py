@@ -0,0 +1,83 @@
+import multiprocessing as mp
+import os
+import sys
+from multiprocessing.connection import wait
+from typing import Any, Callable, List, Optional
+
+
+def get_available_cpus() -> List[int]:
+    return sorted(os.sched_getaffinity(0))
+
+
+def _run_job(target: Callable[[Any, List[int]], None], job: Any, cpus: List[int], log_path: Optional[str]):
+    os.sched_setaffinity(0, cpus)
+
+    if log_path is not None:
+        # Parallel jobs would interleave their output, also the output of VizDoom and other native code
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        log_file = open(log_path, 'a', buffering=1)
+        os.dup2(log_file.fileno(), sys.stdout.fileno())
+        os.dup2(log_file.fileno(), sys.stderr.fileno())
+        sys.stdout = sys.stderr = log_file
+
+    target(job, cpus)
+
+
+def run_jobs(
+        target: Callable[[Any, List[int]], None],
+        jobs: List[Any],
+        required_cpus: List[int],
+        log_paths: Optional[List[Optional[str]]] = None,
+        cpus: Optional[List[int]] = None,
+        start_method: str = 'spawn'
+) -> List[int]:
+    """
+    Runs target(job, job_cpus) for every job in its own process, as many at once as there are free CPUs.
+    Each process is pinned to a disjoint set of required_cpus CPUs. Jobs needing more CPUs than available get all
+    of them. Jobs start in list order, a job that does not fit yet is skipped for a later one that fits.
+
+    :param target: function run in the job process, must be importable
+    :param jobs: arguments of target
+    :param required_cpus: number of CPUs of each job
+    :param log_paths: files the output of each job process is redirected to, output is not redirected by default
+    :param cpus: CPUs to schedule on, all CPUs available to this process by default
+    :param start_method: multiprocessing start method of job processes
+    :return: exit codes of the job processes
+    """
+    free_cpus = sorted(cpus or get_available_cpus())
+    cpus_number = len(free_cpus)
+    log_paths = log_paths or [None] * len(jobs)
+    ctx = mp.get_context(start_method)
+
+    queue = list(range(len(jobs)))
+    # sentinel -> (process, job index, job cpus)
+    running = {}
+    exit_codes = [None] * len(jobs)
+
+    try:
+        while queue or running:
+            for job_idx in list(queue):
+                job_cpus_number = min(required_cpus[job_idx], cpus_number)
+                if job_cpus_number > len(free_cpus):
+                    continue
+
+                job_cpus, free_cpus = free_cpus[:job_cpus_number], free_cpus[job_cpus_number:]
+                queue.remove(job_idx)
+
+                process = ctx.Process(target=_run_job, args=(target, jobs[job_idx], job_cpus, log_paths[job_idx]))
+                process.start()
+                running[process.sentinel] = (process, job_idx, job_cpus)
+                print(f'Started job {job_idx} on CPUs {job_cpus}')
+
+            for sentinel in wait(list(running)):
+                process, job_idx, job_cpus = running.pop(sentinel)
+                process.join()
+                exit_codes[job_idx] = process.exitcode
+                free_cpus = sorted(free_cpus + job_cpus)
+                print(f'Finished job {job_idx} with exit code {process.exitcode}')
+    finally:
+        for process, _, _ in running.values():
+            process.terminate()
+            process.join()
+
+    return exit_codes
@@ -0,0 +1,193 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+META_FILE = 'meta.json'
+EPISODES_FILE = 'episodes.bin'
+
+
+def _chunk_path(path: str, field: str, chunk: int) -> str:
+    return os.path.join(path, f'{field}_{chunk:06d}.npy')
+
+
+def _read_committed_episodes(path: str, steps: int) -> np.ndarray:
+    """
+    (first row, rows) pairs of episodes.bin, which end within the first steps rows.
+    A partly written last pair is left out as well.
+    """
+    episodes_path = os.path.join(path, EPISODES_FILE)
+    if not os.path.exists(episodes_path):
+        return np.empty((0, 2), dtype=np.int64)
+
+    episodes = np.fromfile(episodes_path, dtype=np.int64)
+    episodes = episodes[:len(episodes) // 2 * 2].reshape(-1, 2)
+
+    # Episodes are appended in order, so the committed ones are a prefix
+    return episodes[:np.searchsorted(episodes.sum(axis=1), steps, side='right')]
+
+
+class TrajectoryRecorder:
+    """
+    Append-only recording of env steps, one row per step with a value of every field.
+    Every field is stored in memory-mapped .npy chunks of chunk_steps rows, so writing a row is a few copies
+    into mapped memory. When an episode ends, the number of rows is committed to meta.json first and then the episode
+    is appended to episodes.bin as a (first row, rows) pair, so rows of an unfinished episode are not read after
+    a crash. Episodes, which did not end with end_episode before a new episode started or the recorder was closed,
+    are discarded as well. Recording to an existing directory with the same fields continues it, pairs beyond
+    the committed rows, left by a crash, are removed from episodes.bin then.
+
+    :param fields: dtype and row shape of every field
+    """
+
+    def __init__(self, path: str, fields: Dict[str, Tuple[type, Tuple[int, ...]]], chunk_steps: int = 4096):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+        self.fields = {name: [np.dtype(dtype).str, list(shape)] for name, (dtype, shape) in fields.items()}
+        self.chunk_steps = chunk_steps
+        self.steps = 0
+
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta['fields'] != self.fields:
+                raise ValueError(f'Recording in {path} has different fields: {meta["fields"]}')
+            self.chunk_steps = meta['chunk_steps']
+            self.steps = meta['steps']
+
+        self.chunk = None
+        self.chunks = {}
+        self.episode_start = None
+
+        # Rows of episodes not committed are overwritten by the next ones, so their pairs must not be kept
+        episodes_path = os.path.join(path, EPISODES_FILE)
+        committed_episodes = _read_committed_episodes(path, self.steps)
+        self.episodes_file = open(episodes_path, 'ab')
+        self.episodes_file.truncate(committed_episodes.nbytes)
+        self._write_meta()
+
+    def _open_chunk(self, chunk: int):
+        self.chunk = chunk
+        self.chunks = {}
+        for name, (dtype, shape) in self.fields.items():
+            chunk_path = _chunk_path(self.path, name, chunk)
+            if os.path.exists(chunk_path):
+                self.chunks[name] = np.lib.format.open_memmap(chunk_path, mode='r+')
+            else:
+                self.chunks[name] = np.lib.format.open_memmap(chunk_path, mode='w+', dtype=dtype,
+                                                              shape=(self.chunk_steps, *shape))
+
+    def new_episode(self):
+        self.discard_episode()
+        self.episode_start = self.steps
+
+    def record(self, **values):
+        chunk, row = divmod(self.steps, self.chunk_steps)
+        if chunk != self.chunk:
+            self._open_chunk(chunk)
+
+        for name, value in values.items():
+            self.chunks[name][row] = value
+
+        self.steps += 1
+
+    def end_episode(self):
+        if self.episode_start is None:
+            return
+
+        episode = np.array([self.episode_start, self.steps - self.episode_start], dtype=np.int64)
+        self.episode_start = None
+
+        self._write_meta()
+        self.episodes_file.write(episode.tobytes())
+        self.episodes_file.flush()
+
+    def discard_episode(self):
+        """
+        Drops rows of the current episode, they are overwritten by the next ones.
+        """
+        if self.episode_start is None:
+            return
+
+        self.steps = self.episode_start
+        self.episode_start = None
+
+    def close(self):
+        self.discard_episode()
+        for chunk in self.chunks.values():
+            chunk.flush()
+        self.chunks = {}
+        self.episodes_file.close()
+
+    def _write_meta(self):
+        meta_path = os.path.join(self.path, META_FILE)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'fields': self.fields, 'chunk_steps': self.chunk_steps, 'steps': self.steps}, f)
+        os.replace(tmp_path, meta_path)
+
+
+class TrajectoryReader:
+    """
+    Reads rows of a TrajectoryRecorder recording, chunks are memory-mapped when first needed,
+    so only the read rows are loaded. Ranges within one chunk are returned as read-only views,
+    ranges over many chunks are copied.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        self.fields = {name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in meta['fields'].items()}
+        self.chunk_steps = meta['chunk_steps']
+        self.steps = meta['steps']
+
+        # A recording still in progress may have appended episodes after the meta was read
+        self.episodes = _read_committed_episodes(path, self.steps)
+
+        self.chunks = {}
+
+    def __len__(self) -> int:
+        return self.steps
+
+    def _get_chunk(self, field: str, chunk: int) -> np.ndarray:
+        key = (field, chunk)
+        if key not in self.chunks:
+            self.chunks[key] = np.load(_chunk_path(self.path, field, chunk), mmap_mode='r')
+
+        return self.chunks[key]
+
+    def get(self, field: str, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Rows start:stop of a field.
+        """
+        start, stop, _ = slice(start, stop).indices(self.steps)
+        if stop <= start:
+            dtype, shape = self.fields[field]
+            return np.empty((0, *shape), dtype=dtype)
+
+        first_chunk, last_chunk = start // self.chunk_steps, (stop - 1) // self.chunk_steps
+        parts: List[np.ndarray] = []
+        for chunk in range(first_chunk, last_chunk + 1):
+            chunk_start = chunk * self.chunk_steps
+            parts.append(self._get_chunk(field, chunk)[max(start - chunk_start, 0):stop - chunk_start])
+
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def get_steps(self, start: int = 0, stop: Optional[int] = None) -> Dict[str, np.ndarray]:
+        return {field: self.get(field, start, stop) for field in self.fields}
+
+    def get_episode(self, episode: int) -> Dict[str, np.ndarray]:
+        start, length = self.episodes[episode]
+        return self.get_steps(int(start), int(start + length))
+
+
+def open_trajectories(path: str) -> List[TrajectoryReader]:
+    """
+    Readers of all recordings under path, like the env_<index> recordings of a vec env.
+    """
+    return [TrajectoryReader(dir_path) for dir_path, _, file_names in sorted(os.walk(path)) if META_FILE in file_names]
@@ -1,4 +1,6 @@
-import itertools
+import functools
+import hashlib
+import os
 import typing as t
 
 import numpy as np
@@ -23,30 +25,83 @@ EXCLUSIVE_BUTTONS = [
     Button.SELECT_WEAPON9
 ]
 
+ACTION_SPACE_CACHE_DIR = os.path.join(os.path.curdir, 'cache', 'action_space')
 
-def has_exclusive_button(actions: np.ndarray, buttons: np.array) -> np.array:
-    exclusion_mask = np.isin(buttons, EXCLUSIVE_BUTTONS)
 
-    return (np.any(actions.astype(bool) & exclusion_mask, axis=-1)) & (np.sum(actions, axis=-1) > 1)
+def get_legal_action_codes(buttons: t.Sequence[Button]) -> np.ndarray:
+    """
+    Legal button combinations encoded as integers, first button is the most significant bit.
+    Sorted codes are in the same order as itertools.product([0., 1.], repeat=len(buttons)).
+    """
+    bits = [1 << (len(buttons) - 1 - i) for i in range(len(buttons))]
 
+    # Each group and each free button contributes one of its options, exclusive buttons are only used alone
+    options = []
+    grouped = set()
+    for group in MUTUALLY_EXCLUSIVE_GROUPS:
+        group_bits = [bits[i] for i, button in enumerate(buttons) if button in group]
+        grouped.update(i for i, button in enumerate(buttons) if button in group)
+        if group_bits:
+            options.append([0] + group_bits)
 
-def has_excluded_pair(actions: np.ndarray, buttons: np.array) -> np.array:
-    mutual_exclusion_mask = np.array([np.isin(buttons, excluded_group)
-                                      for excluded_group in MUTUALLY_EXCLUSIVE_GROUPS])
+    for i, button in enumerate(buttons):
+        if i not in grouped and button not in EXCLUSIVE_BUTTONS:
+            options.append([0, bits[i]])
 
-    return np.any(np.sum(
-        (actions[:, np.newaxis, :] * mutual_exclusion_mask.astype(int)),
-        axis=-1) > 1, axis=-1)
+    codes = np.zeros(1, dtype=np.int64)
+    for option in options:
+        codes = (codes[:, np.newaxis] + np.array(option, dtype=np.int64)).ravel()
 
+    exclusive_codes = [bits[i] for i, button in enumerate(buttons) if button in EXCLUSIVE_BUTTONS]
+    codes = np.concatenate([codes[1:], np.array(exclusive_codes, dtype=np.int64)])
 
-def get_available_actions(buttons: np.array) -> t.List[t.List[float]]:
-    action_combinations = np.array([list(seq) for seq in itertools.product([0., 1.], repeat=len(buttons))])
+    return np.sort(codes)
 
-    illegal_mask = (has_excluded_pair(action_combinations, buttons)
-                    | has_exclusive_button(action_combinations, buttons))
 
-    possible_actions = action_combinations[~illegal_mask]
-    possible_actions = possible_actions[np.sum(possible_actions, axis=1) > 0]
+def build_action_table(buttons: t.Sequence[Button]) -> np.ndarray:
+    codes = get_legal_action_codes(buttons)
+    shifts = np.arange(len(buttons) - 1, -1, -1, dtype=np.int64)
 
-    # print('Built action space of size {} from buttons {}'.format(len(possible_actions), buttons))
-    return possible_actions.tolist()
+    return np.ascontiguousarray((codes[:, np.newaxis] >> shifts) & 1, dtype=np.float64)
+
+
+def _get_cache_path(buttons: t.Tuple[Button, ...]) -> str:
+    # Constraints are part of the key, so changing them does not reuse stale tables
+    key = repr(([button.name for button in buttons],
+                [[button.name for button in group] for group in MUTUALLY_EXCLUSIVE_GROUPS],
+                [button.name for button in EXCLUSIVE_BUTTONS]))
+
+    return os.path.join(ACTION_SPACE_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.npy')
+
+
+@functools.lru_cache(maxsize=None)
+def _get_cached_action_table(buttons: t.Tuple[Button, ...]) -> np.ndarray:
+    path = _get_cache_path(buttons)
+    if os.path.exists(path):
+        action_table = np.load(path)
+    else:
+        action_table = build_action_table(buttons)
+        _save_action_table(action_table, path)
+
+    # Shared by all envs of the process
+    action_table.flags.writeable = False
+    return action_table
+
+
+def _save_action_table(action_table: np.ndarray, path: str):
+    # Many env processes can build the same table at once, so write to a temporary file first
+    os.makedirs(ACTION_SPACE_CACHE_DIR, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, action_table)
+    os.replace(tmp_path, path)
+
+
+def get_available_actions(buttons: t.Sequence[Button]) -> np.ndarray:
+    """
+    Action table of shape (actions, buttons), cached in memory and on disk by the button tuple.
+    """
+    action_table = _get_cached_action_table(tuple(buttons))
+
+    # print('Built action space of size {} from buttons {}'.format(len(action_table), buttons))
+    return action_table
@@ -18,7 +18,13 @@ class VizDoomBotsEnv(VizDoomEnv):
             memory_size=1,
             advanced_actions=True,
             game_args='',
-            n_bots=3):
+            n_bots=3,
+            interpolation='cubic',
+            native_resolution=True,
+            step_timers=False,
+            decision_interval=1,
+            trajectory_path=None,
+            copy_observations=True):
 
         game_args += '-host 1 -deathmatch +viz_nocheat 0 +cl_run 1 +name AGENT +colorset 0' + \
                          '+sv_forcerespawn 1 +sv_respawnprotect 1 +sv_nocrouch 1 +sv_noexit 1'
@@ -34,16 +40,22 @@ class VizDoomBotsEnv(VizDoomEnv):
             reward_shaping_kwargs,
             memory_size,
             advanced_actions,
-            game_args
+            game_args,
+            interpolation,
+            native_resolution,
+            step_timers,
+            decision_interval,
+            trajectory_path,
+            copy_observations
         )
 
     def _setup_game(self):
         super()._setup_game()
 
-    def step(self, action: ActType):
+    def make_action(self, action: ActType) -> float:
         self._respawn_if_dead()
 
-        return super().step(action)
+        return super().make_action(action)
 
     def reset(self, *, seed: int | None = None, options: dict[str, Any] | None = None):
         self._reset_bots()
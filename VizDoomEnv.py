@@ -9,11 +9,40 @@ from gymnasium.core import ActType
 from gymnasium.spaces import Box, Discrete
 from vizdoom import GameState, GameVariable
 
-from ROERewardShaping import ROERewardShaping
+from FrameBuffer import FrameBuffer
+from ROERewardShaping import ROERewardShaping, EVENTS_TYPES_NUMBER
+from StepTimers import StepTimers
+from TrajectoryRecorder import TrajectoryRecorder
 from VizDoomActionSpace import get_available_actions
 
 wad_path = "Test/DOOM2.WAD"
 
+INTERPOLATIONS = {
+    'nearest': cv2.INTER_NEAREST,
+    'linear': cv2.INTER_LINEAR,
+    'area': cv2.INTER_AREA,
+    'cubic': cv2.INTER_CUBIC,
+}
+
+
+def get_closest_screen_resolution(resolution: tuple[int, int]) -> vzd.ScreenResolution:
+    resolutions = []
+    for name, screen_resolution in vzd.ScreenResolution.__members__.items():
+        width, height = name[len('RES_'):].split('X')
+        resolutions.append((int(width), int(height), screen_resolution))
+
+    # Smallest resolution, which does not need upscaling. Otherwise, the biggest one.
+    not_smaller = [r for r in resolutions if r[0] >= resolution[0] and r[1] >= resolution[1]]
+    if not_smaller:
+        return min(not_smaller, key=lambda r: r[0] * r[1])[2]
+
+    return max(resolutions, key=lambda r: r[0] * r[1])[2]
+
+
+# Methods timed with step_timers, each one is a stage of step or reset
+TIMED_STAGES = ['step', 'reset', 'make_action', 'get_state', 'shape_reward', 'prepare_color_buffer',
+                'get_memory_matrix', 'new_episode', 'record_step']
+
 
 class VizDoomEnv(Env):
     def __init__(
@@ -27,7 +56,13 @@ class VizDoomEnv(Env):
             reward_shaping_kwargs={},
             memory_size=1,
             advanced_actions=True,
-            game_args=''
+            game_args='',
+            interpolation='cubic',
+            native_resolution=True,
+            step_timers=False,
+            decision_interval=1,
+            trajectory_path=None,
+            copy_observations=True
     ):
         super().__init__()
 
@@ -36,6 +71,15 @@ class VizDoomEnv(Env):
         )
         self.resolution = resolution
         self.frame_skip = frame_skip
+        self.interpolation = INTERPOLATIONS[interpolation]
+        self.native_resolution = native_resolution
+        # Each step repeats the action for decision_interval make_action calls, only the last state is preprocessed
+        if decision_interval < 1:
+            raise ValueError(f'decision_interval must be at least 1, got {decision_interval}')
+        self.decision_interval = decision_interval
+        # Without copying, observations are views of the frame buffer, which are overwritten by the next step or reset.
+        # Only for callers that copy them right away, like the VizDoomVecEnv workers.
+        self.copy_observations = copy_observations
 
         self._is_window_visible = is_window_visible
 
@@ -50,7 +94,7 @@ class VizDoomEnv(Env):
         self.is_first_step = True
 
         self.memory_size = memory_size
-        self.memory = []
+        self.memory = FrameBuffer(memory_size, resolution)
 
         self.episode_length = 0
 
@@ -59,18 +103,52 @@ class VizDoomEnv(Env):
         self._setup_game()
         self._setup_environment(advanced_actions)
         self.frame_skip = frame_skip
-        self.reward_shaping = reward_shaping_class(**reward_shaping_kwargs)
+        self.reward_shaping = None
+        if reward_shaping_class is not None:
+            self.reward_shaping = reward_shaping_class(**reward_shaping_kwargs)
+            self.reward_shaping.set_available_game_variables(self.available_game_variables)
 
         self.is_first_step = True
 
+        # Every step is recorded to trajectory_path, see TrajectoryRecorder
+        self.trajectory_recorder = None
+        if trajectory_path is not None:
+            self.trajectory_recorder = TrajectoryRecorder(trajectory_path, {
+                # Newest frame of the observation, stacked observations are consecutive frames of the episode
+                'frame': (np.uint8, (resolution[1], resolution[0])),
+                # -1 for the first frame of an episode
+                'action': (np.int64, ()),
+                'reward': (np.float32, ()),
+                'terminated': (np.bool_, ()),
+                # NaN without a game state, after the episode finished
+                'game_variables': (np.float32, (len(self.available_game_variables),)),
+                # Events of the episode so far, zeros without ROE reward shaping
+                'episode_events': (np.float32, (EVENTS_TYPES_NUMBER,)),
+            })
+
+        # Timed methods are replaced on the instance, so without timers there is no overhead at all
+        self.step_timers = None
+        if step_timers:
+            self.step_timers = StepTimers(TIMED_STAGES)
+            for stage in TIMED_STAGES:
+                setattr(self, stage, self.step_timers.wrap(stage, getattr(self, stage)))
+
     def _setup_game(self):
         self.game.load_config(self.scenario_path)
         self._settup_doom_variables()
 
+        if self.native_resolution:
+            self.game.set_screen_resolution(get_closest_screen_resolution(self.resolution))
+            self.game.set_screen_format(vzd.ScreenFormat.GRAY8)
+
         self.game.add_game_args(self.game_args)
         self.game.set_window_visible(self._is_window_visible)
         self.game.init()
 
+        self.available_game_variables = self.game.get_available_game_variables()
+        # Game variables of the last step, None if there was no state
+        self.game_variables = None
+
     def _setup_environment(self, advanced_actions: bool):
         available_buttons = self.game.get_available_buttons()
         if advanced_actions:
@@ -83,79 +161,140 @@ class VizDoomEnv(Env):
         self.action_space = Discrete(len(self.available_actions))
 
     def step(self, action: ActType):
-        reward = self.game.make_action(self.available_actions[action], self.frame_skip)
+        reward = 0
+        for _ in range(self.decision_interval):
+            doom_state, tick_reward = self._tick(action)
+            reward += tick_reward
+
+            if self.game.is_episode_finished():
+                break
+
+        # Frames are stacked once per step, so stacked frames are decision_interval * frame_skip tics apart
+        screen_buffer = doom_state.screen_buffer if doom_state else None
+
+        terminated = self.game.is_episode_finished()
+        truncated = False
+
+        self.append_frame_to_memory(screen_buffer)
+
+        if self.trajectory_recorder is not None:
+            self.record_step(action, reward, terminated, self.game_variables)
 
-        # Get State data
-        if self.game.get_state():
-            doom_state: GameState = self.game.get_state()
-            screen_buffer = doom_state.screen_buffer
-            screen_buffer = self.prepare_color_buffer(screen_buffer)
+        info = {}
+        if terminated:
+            # Statistics are sent with the last step, so they do not need to be requested from the env every step
+            info['episode_statistics'] = self.get_statistics()
 
             if self.reward_shaping is not None:
-                if self.is_first_step:
-                    self.reward_shaping.first_step(self.game)
-                else:
-                    self.reward_shaping.step(self.game)
+                self.reward_shaping.episode_finished()
 
-                reward = self.reward_shaping.get_reward(reward)
+        return self._get_observation(), reward, terminated, truncated, info
+
+    def _tick(self, action: ActType) -> tuple[GameState, float]:
+        """
+        Advances the game by one make_action call, reward shaping still sees every tick.
+        """
+        reward = self.make_action(action)
+
+        doom_state: GameState = self.get_state()
+        if doom_state:
+            self.game_variables = doom_state.game_variables
+
+            if self.reward_shaping is not None:
+                reward = self.shape_reward(doom_state.game_variables, reward)
 
             self.is_first_step = False
             self.episode_length = self.game.get_episode_time()
 
         else:
-            screen_buffer = np.zeros((self.resolution[1], self.resolution[0]))
+            self.game_variables = None
 
-        terminated = self.game.is_episode_finished()
-        truncated = False
+        return doom_state, reward
 
-        self.append_frame_to_memory(screen_buffer)
+    def make_action(self, action: ActType) -> float:
+        return self.game.make_action(self.available_actions[action], self.frame_skip)
 
-        if terminated and self.reward_shaping is not None:
-            self.reward_shaping.episode_finished()
+    def get_state(self) -> GameState:
+        return self.game.get_state()
+
+    def shape_reward(self, game_variables: np.ndarray, reward: float) -> float:
+        if self.is_first_step:
+            self.reward_shaping.first_step(game_variables)
+        else:
+            self.reward_shaping.step(game_variables)
 
-        return self.get_memory_matrix(), reward, terminated, truncated, {}
+        return self.reward_shaping.get_reward(reward)
+
+    def new_episode(self, recording_path: str = ''):
+        self.game.new_episode(recording_path)
 
     def append_frame_to_memory(self, screen_buffer):
-        self.memory.append(screen_buffer)
-        if len(self.memory) > self.memory_size:
-            self.memory.pop(0)
+        frame = self.memory.next_frame()
+        if screen_buffer is None:
+            frame[:] = 0
+        else:
+            self.prepare_color_buffer(screen_buffer, frame)
+        self.memory.commit_frame()
 
     def reset(self, *, seed: int | None = None, options: dict[str, Any] | None = None):
-        self.game.new_episode()
+        # With options['recording_path'] the episode is recorded to a ViZDoom demo file
+        self.new_episode((options or {}).get('recording_path') or '')
 
         if self.reward_shaping is not None:
             self.reward_shaping.new_episode()
 
-        doom_state: GameState = self.game.get_state()
+        self.game_variables = None
 
-        screen_buffer = doom_state.screen_buffer
-        screen_buffer = self.prepare_color_buffer(screen_buffer)
+        doom_state: GameState = self.get_state()
 
-        self.append_frame_to_memory(screen_buffer)
+        self.append_frame_to_memory(doom_state.screen_buffer)
 
-        memory_matrix = self.get_memory_matrix()
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.new_episode()
+            self.record_step(-1, 0, False, doom_state.game_variables)
+
+        memory_matrix = self._get_observation()
 
         self.is_first_step = True
 
         return memory_matrix, {}
 
+    def _get_observation(self) -> np.ndarray:
+        memory_matrix = self.get_memory_matrix()
+        return memory_matrix.copy() if self.copy_observations else memory_matrix
+
     def get_memory_matrix(self):
-        memory_matrix = np.zeros((self.memory_size, self.resolution[1], self.resolution[0]))
-        for i, frame in enumerate(self.memory):
-            matrix_index = self.memory_size - 1 - i
-            memory_matrix[matrix_index] = frame
-        return memory_matrix
-
-    def prepare_color_buffer(self, observation):
-        resize = cv2.resize(
-            np.moveaxis(observation, 0, -1),
-            self.resolution,
-            interpolation=cv2.INTER_CUBIC,
+        return self.memory.get_frames()
+
+    def prepare_color_buffer(self, observation, out=None):
+        if not self.native_resolution:
+            # Preprocessing used by models trained before native resolution rendering, which transposes the frame
+            observation = np.moveaxis(observation, 0, -1)
+
+        if observation.shape == (self.resolution[1], self.resolution[0]):
+            if out is None:
+                return observation
+            out[:] = observation
+            return out
+
+        return cv2.resize(observation, self.resolution, dst=out, interpolation=self.interpolation)
+
+    def record_step(self, action: ActType, reward: float, terminated: bool, game_variables: np.ndarray | None):
+        self.trajectory_recorder.record(
+            frame=self.memory.get_frames()[0],
+            action=action,
+            reward=reward,
+            terminated=terminated,
+            game_variables=np.nan if game_variables is None else game_variables,
+            episode_events=0 if self.reward_shaping is None else self.reward_shaping.events_this_episode
         )
 
-        return np.reshape(resize, (self.resolution[1], self.resolution[0]))
+        if terminated:
+            self.trajectory_recorder.end_episode()
 
     def close(self):
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.close()
         self.game.close()
 
     def _settup_doom_variables(self):
@@ -187,6 +326,9 @@ class VizDoomEnv(Env):
         self.game.add_available_game_variable(GameVariable.ARMOR)
         self.game.add_available_game_variable(GameVariable.FRAGCOUNT)
         self.game.add_available_game_variable(GameVariable.HEALTH)
+        self.game.add_available_game_variable(GameVariable.SELECTED_WEAPON)
+        self.game.add_available_game_variable(GameVariable.SELECTED_WEAPON_AMMO)
+        self.game.add_available_game_variable(GameVariable.DAMAGECOUNT)
 
     def get_statistics(self):
         result = {}
@@ -196,6 +338,9 @@ class VizDoomEnv(Env):
 
         result["episode_length"] = self.episode_length
 
+        if self.step_timers is not None:
+            result.update(self.step_timers.get_statistics())
+
         return result
 
     def get_position_heat_matrix(self, size: tuple[int, int]):
@@ -0,0 +1,362 @@
+import multiprocessing as mp
+import os
+import pickle
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Type
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv, VecEnvIndices
+
+from ROERewardShaping import StaticBufferROERewardShaping
+
+STEP_COMMAND = b's'
+
+SHARED_BUFFERS = ['observations', 'terminal_observations', 'actions', 'rewards', 'dones', 'game_variables',
+                  'has_game_variables']
+
+
+def _shared_buffer_layout(n_envs, observation_space, n_game_variables):
+    return {
+        'observations': ((n_envs, *observation_space.shape), observation_space.dtype),
+        'terminal_observations': ((n_envs, *observation_space.shape), observation_space.dtype),
+        'actions': ((n_envs,), np.int64),
+        'rewards': ((n_envs,), np.float64),
+        'dones': ((n_envs,), np.bool_),
+        'game_variables': ((n_envs, n_game_variables), np.float64),
+        'has_game_variables': ((n_envs,), np.bool_),
+    }
+
+
+def _attach_shared_buffers(names, layout):
+    memories = {}
+    buffers = {}
+    for buffer_name in SHARED_BUFFERS:
+        shape, dtype = layout[buffer_name]
+        memories[buffer_name] = SharedMemory(name=names[buffer_name])
+        buffers[buffer_name] = np.ndarray(shape, dtype=dtype, buffer=memories[buffer_name].buf)
+
+    return memories, buffers
+
+
+def _write_game_variables(env, buffers, env_idx):
+    game_variables = env.unwrapped.game_variables
+    buffers['has_game_variables'][env_idx] = game_variables is not None
+    if game_variables is not None:
+        buffers['game_variables'][env_idx] = game_variables
+
+
+def _worker(
+        remote,
+        parent_remote,
+        env_fn_wrapper: CloudpickleWrapper,
+        env_idx: int,
+        cpus: Optional[List[int]]
+) -> None:
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    env = env_fn_wrapper.var()
+
+    available_game_variables = env.unwrapped.available_game_variables
+    remote.send((env.observation_space, env.action_space, available_game_variables))
+
+    names, layout = remote.recv()
+    memories, buffers = _attach_shared_buffers(names, layout)
+
+    try:
+        while True:
+            message = remote.recv_bytes()
+
+            if message == STEP_COMMAND:
+                observation, reward, terminated, truncated, info = env.step(buffers['actions'][env_idx])
+                done = terminated or truncated
+                _write_game_variables(env, buffers, env_idx)
+
+                if done:
+                    info['TimeLimit.truncated'] = truncated and not terminated
+                    buffers['terminal_observations'][env_idx] = observation
+                    observation, _ = env.reset()
+
+                buffers['observations'][env_idx] = observation
+                buffers['rewards'][env_idx] = reward
+                buffers['dones'][env_idx] = done
+
+                # Info is empty on ordinary steps, so only episode ends are pickled
+                remote.send_bytes(pickle.dumps(info) if info else b'')
+                continue
+
+            cmd, data = pickle.loads(message)
+            if cmd == 'reset':
+                observation, reset_info = env.reset(seed=data)
+                buffers['observations'][env_idx] = observation
+                buffers['rewards'][env_idx] = 0
+                buffers['dones'][env_idx] = False
+                _write_game_variables(env, buffers, env_idx)
+                remote.send(reset_info)
+            elif cmd == 'close':
+                env.close()
+                remote.close()
+                break
+            elif cmd == 'env_method':
+                method = getattr(env.unwrapped, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == 'get_attr':
+                remote.send(getattr(env.unwrapped, data))
+            elif cmd == 'set_attr':
+                remote.send(setattr(env.unwrapped, data[0], data[1]))
+            elif cmd == 'is_wrapped':
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f'`{cmd}` is not implemented in the worker')
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del buffers
+        for memory in memories.values():
+            memory.close()
+
+
+class VizDoomVecEnv(VecEnv):
+    """
+    Multiprocess vectorized env for VizDoom. Each env runs in its own process and writes observations,
+    rewards, dones and game variables directly into shared memory, so stepping does not pickle
+    observations. Only the info dict of finished episodes, with their episode statistics, is sent through the pipe.
+
+    Besides the synchronous VecEnv api, envs can be stepped asynchronously (EnvPool style): async_reset() and send()
+    start work on a subset of envs and recv() returns the first batch_size envs that finished, with their ids.
+
+    :param env_fns: Environments to run in subprocesses
+    :param start_method: multiprocessing start method, 'forkserver' by default where available
+    :param batch_size: number of envs returned by recv(), all envs by default
+    :param worker_cpus: CPU sets the env processes are pinned to, assigned round-robin, not pinned by default
+    """
+
+    def __init__(
+            self,
+            env_fns: List[Callable[[], gym.Env]],
+            start_method: Optional[str] = None,
+            batch_size: Optional[int] = None,
+            worker_cpus: Optional[List[List[int]]] = None
+    ):
+        self.waiting = False
+        self.closed = False
+        self.batch_size = batch_size or len(env_fns)
+        # env_idx -> 'step' or 'reset', for envs working asynchronously
+        self.pending = {}
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in mp.get_all_start_methods() else 'spawn'
+        ctx = mp.get_context(start_method)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for env_idx, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            cpus = worker_cpus[env_idx % len(worker_cpus)] if worker_cpus else None
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), env_idx, cpus)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        handshakes = [remote.recv() for remote in self.remotes]
+        observation_space, action_space, self.available_game_variables = handshakes[0]
+
+        layout = _shared_buffer_layout(n_envs, observation_space, len(self.available_game_variables))
+        self._memories = {}
+        self._buffers = {}
+        for buffer_name in SHARED_BUFFERS:
+            shape, dtype = layout[buffer_name]
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            self._memories[buffer_name] = SharedMemory(create=True, size=size)
+            self._buffers[buffer_name] = np.ndarray(shape, dtype=dtype, buffer=self._memories[buffer_name].buf)
+
+        names = {buffer_name: memory.name for buffer_name, memory in self._memories.items()}
+        for remote in self.remotes:
+            remote.send((names, layout))
+
+        self._remote_indices = {remote: env_idx for env_idx, remote in enumerate(self.remotes)}
+
+        super().__init__(n_envs, observation_space, action_space)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        assert not self.pending, 'Cannot step synchronously while envs are working asynchronously'
+
+        self._buffers['actions'][:] = actions
+        for remote in self.remotes:
+            remote.send_bytes(STEP_COMMAND)
+        self.waiting = True
+
+    def step_wait(self):
+        messages = [remote.recv_bytes() for remote in self.remotes]
+        self.waiting = False
+
+        dones = self._buffers['dones'].copy()
+        infos = [self._step_info(env_idx, message, dones[env_idx]) for env_idx, message in enumerate(messages)]
+
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+
+        return self._buffers['observations'].copy(), self._buffers['rewards'].copy(), dones, infos
+
+    def _step_info(self, env_idx: int, message: bytes, done: bool) -> Dict[str, Any]:
+        info = pickle.loads(message) if message else {}
+        info.setdefault('TimeLimit.truncated', False)
+        if done:
+            info['terminal_observation'] = self._buffers['terminal_observations'][env_idx].copy()
+        return info
+
+    def async_reset(self) -> None:
+        """
+        Start resetting all envs. Reset observations are returned by following recv() calls.
+        """
+        assert not self.pending, 'Cannot reset while envs are working asynchronously'
+
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(('reset', self._seeds[env_idx]))
+            self.pending[env_idx] = 'reset'
+        self._reset_seeds()
+
+    def send(self, actions: np.ndarray, env_ids: np.ndarray) -> None:
+        """
+        Start stepping envs with given ids, which have to be returned by recv() before.
+        """
+        for env_idx in env_ids:
+            assert env_idx not in self.pending, f'Env {env_idx} is still working'
+
+        self._buffers['actions'][env_ids] = actions
+        for env_idx in env_ids:
+            self.remotes[env_idx].send_bytes(STEP_COMMAND)
+            self.pending[env_idx] = 'step'
+
+    def recv(self):
+        """
+        Wait for the first batch_size envs that finished their work, the rest keeps running.
+
+        :return: observations, rewards, dones, infos and ids of returned envs
+        """
+        batch_size = min(self.batch_size, len(self.pending))
+        assert batch_size > 0, 'No env is working, call send() or async_reset() first'
+
+        ready = []
+        while len(ready) < batch_size:
+            waiting_remotes = [self.remotes[env_idx] for env_idx in self.pending if env_idx not in ready]
+            for remote in wait(waiting_remotes):
+                if len(ready) < batch_size:
+                    ready.append(self._remote_indices[remote])
+
+        env_ids = np.array(ready)
+        infos = []
+        for env_idx in ready:
+            message = self.remotes[env_idx].recv_bytes()
+            if self.pending.pop(env_idx) == 'reset':
+                infos.append(pickle.loads(message))
+            else:
+                infos.append(self._step_info(env_idx, message, self._buffers['dones'][env_idx]))
+
+        return (self._buffers['observations'][env_ids], self._buffers['rewards'][env_ids],
+                self._buffers['dones'][env_ids], infos, env_ids)
+
+    def reset(self):
+        assert not self.pending, 'Cannot reset while envs are working asynchronously'
+
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(('reset', self._seeds[env_idx]))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        self._reset_seeds()
+
+        return self._buffers['observations'].copy()
+
+    def get_game_variables(self, indices: VecEnvIndices = None):
+        """
+        Game variables of each env after the last step, read from shared memory.
+
+        :return: game variables and mask of envs, which had game state in the last step
+        """
+        indices = self._get_indices(indices)
+        return self._buffers['game_variables'][indices], self._buffers['has_game_variables'][indices]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv_bytes()
+        for env_idx in self.pending:
+            self.remotes[env_idx].recv_bytes()
+        self.pending = {}
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+
+        self._buffers = {}
+        for memory in self._memories.values():
+            memory.close()
+            memory.unlink()
+        self.closed = True
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(('get_attr', attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(('set_attr', (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name: str, *method_args, indices: VecEnvIndices = None, **method_kwargs) -> List[Any]:
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(('env_method', (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class: Type[gym.Wrapper], indices: VecEnvIndices = None) -> List[bool]:
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(('is_wrapped', wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def _get_target_remotes(self, indices: VecEnvIndices) -> List[Any]:
+        return [self.remotes[i] for i in self._get_indices(indices)]
+
+
+def make_vizdoom_vec_env(
+        env_class: Type[gym.Env],
+        n_envs: int,
+        env_kwargs: Optional[Dict[str, Any]] = None,
+        start_method: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        worker_cpus: Optional[List[List[int]]] = None
+) -> VizDoomVecEnv:
+    """
+    Counterpart of stable_baselines3 make_vec_env, which creates a VizDoomVecEnv with Monitor wrapped envs.
+    With a trajectory_path env kwarg, every env records to its own env_<index> directory in it.
+    """
+    env_kwargs = env_kwargs or {}
+
+    # The static buffer is a class attribute, so every env process would get its own buffer
+    reward_shaping_class = env_kwargs.get('reward_shaping_class')
+    if n_envs > 1 and isinstance(reward_shaping_class, type) \
+            and issubclass(reward_shaping_class, StaticBufferROERewardShaping):
+        raise ValueError(f'{reward_shaping_class.__name__} cannot share its event buffer between env processes, '
+                         f'use ROEVecEnvWrapper (TrainingRun.shared_buffer) instead')
+
+    def make_env_fn(env_idx: int):
+        # Workers copy observations into shared memory before the next step or reset
+        kwargs = {'copy_observations': False, **env_kwargs}
+        if kwargs.get('trajectory_path') is not None:
+            kwargs = {**kwargs, 'trajectory_path': os.path.join(kwargs['trajectory_path'], f'env_{env_idx}')}
+
+        return lambda: Monitor(env_class(**kwargs))
+
+    return VizDoomVecEnv([make_env_fn(env_idx) for env_idx in range(n_envs)], start_method=start_method,
+                         batch_size=batch_size, worker_cpus=worker_cpus)